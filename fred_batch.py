@@ -0,0 +1,253 @@
+import os
+import sys
+import csv
+import json
+import glob
+import time
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+from fred_core import Profile, ResultCache, extract_statements, reconcile_batch, run_pipeline, file_name, profiling
+from fred_export import ExportWriter, export_payload, write_export
+from fred_store import append_results, arrow
+
+# ==========================================
+# 无界面批处理：python fred_batch.py <目录|通配符|文件>... -t BS -o out/ [-j 8 --timeout 300]
+# ==========================================
+SUPPORTED_EXTS = ('.xlsx', '.xls', '.pdf', '.csv')
+RECONCILE_BATCH = 32  # 单进程模式每攒够这么多个文件批量勾稽一次
+MAX_SPAWN_FAILURES = 3  # 多进程模式下子进程连续这么多次没接到任务就退出 (多半是启动即失败)，放弃剩余文件
+
+def collect_inputs(patterns):
+    files = []
+    for p in patterns:
+        if os.path.isdir(p):
+            files += sorted(os.path.join(p, f) for f in os.listdir(p) if f.lower().endswith(SUPPORTED_EXTS))
+        else:
+            files += sorted(f for f in glob.glob(p) if f.lower().endswith(SUPPORTED_EXTS))
+    seen = set()
+    return [f for f in files if not (f in seen or seen.add(f))]
+
+def output_path(out_dir, path, table_type):
+    stem = os.path.splitext(os.path.basename(file_name(path)))[0]
+    return os.path.join(out_dir, f"{stem}_{table_type}.xlsx")
+
+def summarize(path, table_type, result=None, error=None, elapsed=0.0):
+    row = {"文件": path, "报表类型": table_type, "耗时(秒)": round(elapsed, 3)}
+    if error is not None:
+        row.update({"状态": "超时" if isinstance(error, TimeoutError) else "解析失败", "科目数": 0, "说明": str(error)})
+    elif result["df_clean"].empty:
+        row.update({"状态": "无科目", "科目数": 0, "说明": "未能提取到任何有效科目。"})
+    else:
+        row.update({"状态": "失衡" if result["err_msg"] else "通过", "科目数": len(result["df_clean"]), "说明": "；".join(result["err_msg"])})
+    return row
+
+def save_outputs(path, table_type, result, out_dir, combine=False, store_dir=None, period=None):
+    if result["df_clean"].empty: return None
+    write_export(output_path(out_dir, path, table_type), [(path, table_type, result)])
+    # 结果库按文件各写一个 parquet 分片，子进程直接追加，不经主进程
+    if store_dir: append_results(store_dir, path, table_type, result, period)
+    # 合并工作簿由主进程统一写，子进程只回传导出所需字段
+    return export_payload(result) if combine else None
+
+def process_file(path, table_type, out_dir, pdf_workers=None, locate_pages=True, layout_dir=None, profile=False, combine=False, store_dir=None, period=None):
+    t0 = time.perf_counter()
+    with profiling() as prof:
+        try:
+            # 版式库落盘：同一模板的月报第二次起直接按坐标取数，多进程之间通过目录共享
+            layouts = ResultCache(256, layout_dir) if layout_dir else None
+            result = run_pipeline(path, table_type, None, pdf_workers, locate_pages, layouts)
+        except Exception as e:
+            row = summarize(path, table_type, error=e, elapsed=time.perf_counter() - t0)
+        else:
+            payload = save_outputs(path, table_type, result, out_dir, combine, store_dir, period)
+            row = summarize(path, table_type, result, elapsed=time.perf_counter() - t0)
+            if combine: row["export"] = payload
+    if profile: row["profile"] = prof.as_dict()
+    return row
+
+def process_batch(tasks, table_type, out_dir, pdf_workers=None, locate_pages=True, layout_dir=None, profile=False, combine=False, store_dir=None, period=None):
+    # 单进程模式：一批文件先逐个取数，再用 reconcile_batch 一次勾稽整批 (每条规则只执行一次)，最后逐个落地
+    layouts = ResultCache(256, layout_dir) if layout_dir else None
+    files = []
+    for idx, path in tasks:
+        f = {"idx": idx, "path": path, "prof": Profile()}
+        t0 = time.perf_counter()
+        with profiling(f["prof"]):
+            try:
+                # 原始表用不到，只留归一化表 (结果库推断报告期要用)，整批驻留内存时少占一份
+                _, f["sheet"], f["hits"], f["source"] = extract_statements(path, [table_type], None, pdf_workers, locate_pages, layouts)[table_type]
+            except Exception as e:
+                f["error"] = e
+        f["elapsed"] = time.perf_counter() - t0
+        files.append(f)
+
+    ok = [f for f in files if "error" not in f]
+    t0 = time.perf_counter()
+    results = reconcile_batch([f["hits"] for f in ok], table_type) if ok else []
+    share = (time.perf_counter() - t0) / max(len(ok), 1)
+    for f, res in zip(ok, results): f["result"] = {"sheet": f["sheet"], "source": f["source"], **res}
+
+    for f in files:
+        t0 = time.perf_counter()
+        with profiling(f["prof"]):
+            if "error" in f:
+                row = summarize(f["path"], table_type, error=f["error"], elapsed=f["elapsed"])
+            else:
+                # 整批勾稽的耗时按文件均摊
+                f["prof"].stages["勾稽"] = f["prof"].stages.get("勾稽", 0.0) + share
+                payload = save_outputs(f["path"], table_type, f["result"], out_dir, combine, store_dir, period)
+                row = summarize(f["path"], table_type, f["result"], elapsed=f["elapsed"] + share + time.perf_counter() - t0)
+                if combine: row["export"] = payload
+        if profile: row["profile"] = f["prof"].as_dict()
+        yield f["idx"], row
+
+def worker_loop(conn, table_type, out_dir, pdf_workers, locate_pages, layout_dir=None, profile=False, combine=False, store_dir=None, period=None):
+    # 常驻子进程：fred_core (含编译好的别名自动机) 只在启动时导入一次，之后所有文件复用
+    conn.send(("ready", None))
+    while True:
+        task = conn.recv()
+        if task is None: break
+        idx, path = task
+        conn.send(("done", (idx, process_file(path, table_type, out_dir, pdf_workers, locate_pages, layout_dir, profile, combine, store_dir, period))))
+
+def run_pool(files, table_type, out_dir, jobs, timeout=None, pdf_workers=1, locate_pages=True, layout_dir=None, profile=False, combine=False, store_dir=None, period=None):
+    # 多进程吞吐模式：谁先完成先产出 (idx, row)；单文件超时或子进程崩溃只终止该进程并补一个新进程，不拖住整批
+    ctx = multiprocessing.get_context("spawn")
+    pending = list(enumerate(files))[::-1]
+    workers, remaining, spawn_failures, spawn_error = {}, len(files), 0, None
+
+    def spawn():
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=worker_loop, args=(child, table_type, out_dir, pdf_workers, locate_pages, layout_dir, profile, combine, store_dir, period), daemon=True)
+        proc.start()
+        child.close()
+        workers[parent] = {"proc": proc, "task": None, "deadline": None, "t0": None}
+
+    def retire(conn, error):
+        nonlocal spawn_failures, spawn_error
+        w = workers.pop(conn)
+        if w["proc"].is_alive(): w["proc"].terminate()
+        w["proc"].join()
+        conn.close()
+        if w["task"] is None: spawn_failures, spawn_error = spawn_failures + 1, error
+        if pending and spawn_failures < MAX_SPAWN_FAILURES: spawn()
+        if w["task"] is None: return None
+        idx, path = w["task"]
+        return idx, summarize(path, table_type, error=error, elapsed=time.monotonic() - w["t0"])
+
+    for _ in range(min(jobs, len(files))): spawn()
+    try:
+        while remaining:
+            for conn in wait(list(workers), timeout=0.5):
+                w = workers[conn]
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    out = retire(conn, RuntimeError(f"子进程异常退出 (exitcode={w['proc'].exitcode})"))
+                    if out: remaining -= 1; yield out
+                    continue
+                spawn_failures = 0
+                if kind == "done":
+                    w["task"] = None
+                    remaining -= 1
+                    yield payload
+                if pending:
+                    w["task"] = pending.pop()
+                    w["t0"] = time.monotonic()
+                    w["deadline"] = w["t0"] + timeout if timeout else None
+                    conn.send(w["task"])
+
+            # 子进程起不来 (如改字典后导入报错) 时不再无限重启，剩余文件直接记为失败
+            if spawn_failures >= MAX_SPAWN_FAILURES and pending:
+                error = RuntimeError(f"子进程连续 {spawn_failures} 次启动失败，放弃剩余文件：{spawn_error}")
+                while pending:
+                    idx, path = pending.pop()
+                    remaining -= 1
+                    yield idx, summarize(path, table_type, error=error)
+
+            now = time.monotonic()
+            for conn, w in list(workers.items()):
+                if w["task"] is not None and w["deadline"] is not None and now > w["deadline"]:
+                    out = retire(conn, TimeoutError(f"超过 {timeout} 秒未完成，已终止"))
+                    remaining -= 1
+                    yield out
+    finally:
+        for conn, w in workers.items():
+            try: conn.send(None)
+            except OSError: pass
+        for conn, w in workers.items():
+            w["proc"].join(timeout=5)
+            if w["proc"].is_alive(): w["proc"].terminate()
+            conn.close()
+
+def write_summary(rows, out_dir):
+    path = os.path.join(out_dir, "summary.csv")
+    # utf-8-sig 便于直接用 Excel 打开
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        w = csv.DictWriter(f, fieldnames=["文件", "报表类型", "状态", "科目数", "耗时(秒)", "说明"], extrasaction='ignore')
+        w.writeheader()
+        w.writerows(rows)
+    return path
+
+def write_profiles(rows, out_dir):
+    # 每个文件一行 JSON：分段耗时 (秒)、计数器、逐科目热点
+    path = os.path.join(out_dir, "profile.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        for r in rows: f.write(json.dumps({"文件": r["文件"], "报表类型": r["报表类型"], **r.get("profile", {})}, ensure_ascii=False) + "\n")
+    return path
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fred ETL 批量提取：每个文件输出一份标准化 XLSX，并汇总勾稽失败清单")
+    ap.add_argument("inputs", nargs="+", help="文件、目录或通配符 (如 'drop/2024-*/*.pdf')")
+    ap.add_argument("-t", "--table-type", choices=["BS", "PL"], default="BS", help="报表类型 (默认 BS)")
+    ap.add_argument("-o", "--out", default="fred_output", help="输出目录 (默认 fred_output)")
+    ap.add_argument("--pdf-workers", type=int, default=None, help="PDF 并行解析进程数")
+    ap.add_argument("--all-pages", action="store_true", help="PDF 不做报表页定位，解析全部页")
+    ap.add_argument("--layout-dir", default=None, help="版式库目录：记住每种报表模板的取数坐标，重复模板直接复用")
+    ap.add_argument("--profile", action="store_true", help="记录每个文件的分段耗时与热点计数，写入 profile.jsonl")
+    ap.add_argument("--combine", metavar="XLSX", default=None, help="另把所有文件的结果合并写进一个工作簿 (相对路径放在输出目录下)")
+    ap.add_argument("--store", metavar="DIR", default=None, help="另把标准化结果追加进 Parquet 结果库 (按报表类型/报告期分区，需 pyarrow)")
+    ap.add_argument("--period", default=None, help="写入结果库时使用的报告期 (如 2024-12)；默认从表头日期推断")
+    ap.add_argument("-j", "--jobs", type=int, default=1, help="并行处理文件的进程数 (默认 1，即逐个处理)")
+    ap.add_argument("--timeout", type=float, default=300, help="多进程模式下单个文件的超时秒数，超时即终止该文件 (默认 300，0 为不限)")
+    args = ap.parse_args(argv)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("没有找到可处理的文件 (.xlsx/.xls/.pdf/.csv)", file=sys.stderr)
+        return 2
+    os.makedirs(args.out, exist_ok=True)
+    if args.store: arrow()  # 缺 pyarrow 时在开跑前报错，而不是每个文件各失败一次
+
+    t0 = time.perf_counter()
+    if args.jobs > 1:
+        # 多进程模式下每个文件内部不再开 PDF 进程池，避免进程数相乘
+        done = run_pool(files, args.table_type, args.out, args.jobs, args.timeout or None, args.pdf_workers or 1, not args.all_pages, args.layout_dir, args.profile, bool(args.combine), args.store, args.period)
+    else:
+        # 单进程模式按批取数、批量勾稽；多进程模式每个文件要能单独超时终止，仍逐个勾稽
+        tasks = list(enumerate(files))
+        done = (item for i in range(0, len(tasks), RECONCILE_BATCH)
+                for item in process_batch(tasks[i:i + RECONCILE_BATCH], args.table_type, args.out, args.pdf_workers, not args.all_pages, args.layout_dir, args.profile, bool(args.combine), args.store, args.period))
+
+    # 合并工作簿按完成顺序边到边写，不在内存里攒全部结果
+    combined = ExportWriter(os.path.join(args.out, args.combine)) if args.combine else None
+    results = {}
+    for idx, row in done:
+        payload = row.pop("export", None)
+        if combined and payload is not None: combined.add(row["文件"], args.table_type, payload)
+        results[idx] = row
+        print(f"[{len(results)}/{len(files)}] {row['状态']}  {row['文件']}  {row['耗时(秒)']}s  {row['说明']}", flush=True)
+    rows = [results[i] for i in range(len(files))]
+    elapsed = time.perf_counter() - t0
+
+    summary = write_summary(rows, args.out)
+    if combined: print(f"合并工作簿见 {combined.close()}")
+    if args.store: print(f"结果库见 {args.store}")
+    if args.profile: print(f"分段耗时与热点计数见 {write_profiles(rows, args.out)}")
+    failed = [r for r in rows if r["状态"] != "通过"]
+    print(f"\n共 {len(rows)} 个文件：通过 {len(rows) - len(failed)}，未通过 {len(failed)}；用时 {elapsed:.1f}s ({len(rows) / max(elapsed, 1e-9) * 3600:.0f} 个/小时)。汇总见 {summary}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import os
+import ast
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import subprocess
+import pandas as pd
+import fred_core as fc
+
+# ==========================================
+# 性能基准：python fred_bench.py [--quick] [-f csv,xlsx,pdf] [-r 3] [-o fred_bench.jsonl] [--label 名称]
+#           python fred_bench.py --report fred_bench.jsonl   (按 label 对比历次记录)
+# ==========================================
+# 每个用例：(名称, 报表类型, 生成参数)；rows=额外明细行数，extra_cols=右侧附加数字列数
+CASES = [
+    ("bs_plain", "BS", {}),
+    ("bs_messy", "BS", {"aliases": "mixed", "notes": True, "paren": 0.15, "header_offset": 4, "merged_header": True}),
+    ("bs_two_side", "BS", {"aliases": "mixed", "notes": True, "two_side": True}),
+    ("bs_large", "BS", {"aliases": "mixed", "notes": True, "paren": 0.1, "rows": 1500, "extra_cols": 6}),
+    ("pl_plain", "PL", {}),
+    ("pl_messy", "PL", {"aliases": "mixed", "notes": True, "paren": 0.15, "header_offset": 3, "merged_header": True}),
+    ("pl_large", "PL", {"aliases": "mixed", "notes": True, "rows": 1500, "extra_cols": 6}),
+]
+QUICK_CASES = ["bs_messy", "bs_two_side", "pl_messy"]
+HEADERS = {"BS": ("期末余额", "年初余额"), "PL": ("本期金额", "本年累计数")}
+MAX_PDF_ROWS = 600
+
+# ==========================================
+# 1. 合成报表生成
+# ==========================================
+def plain_aliases(aliases):
+    return [a for a in aliases if not (fc.is_regex_alias(a) or '[' in a)]
+
+def fake_value(rnd, paren):
+    x = round(rnd.choice([0.0, rnd.uniform(-1e6, 1e7), rnd.uniform(1e3, 1e5)]), 2)
+    if x and rnd.random() < paren: return f"({abs(x):,.2f})"
+    if rnd.random() < 0.1 and not x: return "-"
+    return f"{x:,.2f}" if rnd.random() < 0.4 else x
+
+def make_statement(table_type="BS", seed=0, rows=0, extra_cols=0, aliases="std", notes=False, paren=0.0, header_offset=0, merged_header=False, two_side=False):
+    # 返回 (DataFrame, 合并单元格 [(r1, c1, r2, c2)])；表头可下移若干行、可拆成两行合并表头
+    rnd = random.Random(seed)
+    std_map = fc.BS_STANDARD_MAP if table_type == "BS" else fc.PL_STANDARD_MAP
+    keys = list(std_map)
+
+    def label(k):
+        text = rnd.choice(plain_aliases(std_map[k]) or [k]) if aliases == "mixed" else k
+        return (f"{rnd.randint(1, 30)}." if aliases == "mixed" and rnd.random() < 0.2 else "") + text
+
+    def block(ks):
+        body = [[label(k)] + ([rnd.randint(1, 60)] if notes else []) + [fake_value(rnd, paren), fake_value(rnd, paren)] for k in ks]
+        # 明细填充行随机插入，标签不命中任何别名
+        for i in range(rows // (2 if two_side else 1)):
+            body.insert(rnd.randint(0, len(body)), [f"附表行{i}"] + ([""] if notes else []) + [fake_value(rnd, paren), fake_value(rnd, paren)])
+        return body
+
+    split = keys.index("短期借款") if table_type == "BS" and two_side and "短期借款" in keys else len(keys)
+    sides = [block(keys[:split])] + ([block(keys[split:])] if split < len(keys) else [])
+    width = (2 if notes else 1) + 2
+    p_cur, p_pre = HEADERS[table_type]
+
+    head = [["XX有限公司"], [f"{2024 - seed % 3}年12月31日", "", "单位:元"]] + [[""] for _ in range(header_offset)]
+    h, top, sub, merges = len(head), [], [], []
+    for s in range(len(sides)):
+        lead = ["项目"] + (["附注"] if notes else [])
+        if merged_header:
+            # 两行表头：期间词在上、"余额/金额"在下，项目/附注列纵向合并
+            top += lead + [p_cur[:2], p_pre[:2]]
+            sub += [""] * len(lead) + [p_cur[2:], p_pre[2:]]
+            merges += [(h, s * width + i, h + 1, s * width + i) for i in range(len(lead))]
+        else:
+            top += lead + [p_cur, p_pre]
+    head += [top] + ([sub] if merged_header else [])
+
+    body_len = max(len(b) for b in sides)
+    body = []
+    for i in range(body_len):
+        row = []
+        for s, b in enumerate(sides):
+            row += b[i] if i < len(b) else [""] * width
+        row += [round(rnd.uniform(0, 1e5), 2) for _ in range(extra_cols)]
+        body.append(row)
+    n_cols = width * len(sides) + extra_cols
+    df = pd.DataFrame([r + [""] * (n_cols - len(r)) for r in head + body])
+    return df, merges
+
+def write_case(df, merges, path):
+    ext = path.rsplit('.', 1)[-1]
+    if ext == 'csv':
+        df.to_csv(path, header=False, index=False)
+    elif ext == 'xlsx':
+        from openpyxl import Workbook
+        wb = Workbook()
+        ws = wb.active
+        for row in df.itertuples(index=False): ws.append([None if x == "" else x for x in row])
+        for r1, c1, r2, c2 in merges: ws.merge_cells(start_row=r1 + 1, start_column=c1 + 1, end_row=r2 + 1, end_column=c2 + 1)
+        wb.save(path)
+    elif ext == 'pdf':
+        # reportlab 只是生成 PDF 基准样本用的可选依赖
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+        pdfmetrics.registerFont(UnicodeCIDFont('STSong-Light'))
+        table = Table([[str(x) for x in row] for row in df.itertuples(index=False)])
+        table.setStyle(TableStyle([('FONTNAME', (0, 0), (-1, -1), 'STSong-Light'), ('FONTSIZE', (0, 0), (-1, -1), 6), ('GRID', (0, 0), (-1, -1), 0.3, 'black')]))
+        SimpleDocTemplate(path, pagesize=A4).build([table])
+
+# ==========================================
+# 2. 引擎：v2.4 (fred_core) 与 v1.4 (原逐格 iloc 扫描，直接取自 v1.4.py)
+# ==========================================
+def load_legacy_engine(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "v1.4.py")):
+    # 只执行 v1.4.py 顶层的导入、字典与函数定义；凡是用到 streamlit (st) 的语句一律跳过
+    uses_st = lambda n: any(a.name == "streamlit" for a in getattr(n, "names", [])) or any(isinstance(x, ast.Name) and x.id == "st" for x in ast.walk(n))
+    keep = [n for n in ast.parse(open(path, encoding='utf-8').read()).body if isinstance(n, (ast.Import, ast.FunctionDef, ast.Assign)) and not uses_st(n)]
+    ns = {}
+    exec(compile(ast.Module(body=keep, type_ignores=[]), path, "exec"), ns)
+    return ns
+
+class _Named(str):
+    # v1.4 的 load_file 要读 .name (上传对象)，其余读取函数直接拿路径字符串
+    @property
+    def name(self): return str(self)
+
+def run_v24(path, table_type):
+    t0 = time.perf_counter()
+    raw = fc.load_statements(path, 1, True)[table_type][0]
+    t1 = time.perf_counter()
+    hits = fc.extract_statement(fc.normalize_sheet(raw), table_type)
+    t2 = time.perf_counter()
+    result = fc.reconcile_statement(hits, table_type)
+    t3 = time.perf_counter()
+    return (t1 - t0, t2 - t1, t3 - t2), len(result["df_clean"])
+
+def run_v14(legacy, path, table_type):
+    t0 = time.perf_counter()
+    raw = legacy["load_file"](_Named(path))
+    t1 = time.perf_counter()
+    res = []
+    for k in legacy["STANDARD_MAP"]:
+        v_pre, v_cur = legacy["grid_search"](raw, k, "期初")[0], legacy["grid_search"](raw, k, "期末")[0]
+        if v_pre != 0 or v_cur != 0: res.append({"标准科目": k, "期初余额": v_pre, "期末余额": v_cur})
+    t2 = time.perf_counter()
+    df_clean = pd.DataFrame(res).fillna(0.0)
+    for p in ['期初', '期末']: legacy["calculate_net_and_totals"](df_clean, p)
+    t3 = time.perf_counter()
+    return (t1 - t0, t2 - t1, t3 - t2), len(df_clean)
+
+# ==========================================
+# 3. 计时、记录与对比
+# ==========================================
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_bench(cases, formats, engines, repeat, work_dir, label):
+    legacy = load_legacy_engine() if "v1.4" in engines else None
+    os.makedirs(work_dir, exist_ok=True)
+    commit, records = git_commit(), []
+    for name, table_type, params in cases:
+        df, merges = make_statement(table_type, seed=len(name), **params)
+        for fmt in formats:
+            if fmt == 'pdf' and len(df) > MAX_PDF_ROWS:
+                print(f"  跳过 {name}.pdf：{len(df)} 行超过 {MAX_PDF_ROWS} 行，PDF 抽表太慢")
+                continue
+            path = os.path.join(work_dir, f"{name}.{fmt}")
+            try:
+                write_case(df, merges, path)
+            except ImportError as e:
+                print(f"  跳过 {name}.{fmt}：{e}")
+                continue
+            for engine in engines:
+                if engine == "v1.4" and table_type != "BS": continue  # v1.4 只有资产负债表
+                runs = [run_v24(path, table_type) if engine == "v2.4" else run_v14(legacy, path, table_type) for _ in range(repeat)]
+                med = [statistics.median(r[0][i] for r in runs) for i in range(3)]
+                rec = {"label": label, "commit": commit, "map_version": fc.MAP_VERSION, "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "case": name, "table_type": table_type, "format": fmt, "engine": engine, "rows": len(df), "cols": len(df.columns),
+                       "load": round(med[0], 5), "extract": round(med[1], 5), "reconcile": round(med[2], 5), "total": round(sum(med), 5),
+                       "accounts": runs[-1][1], "repeat": repeat, "params": params}
+                records.append(rec)
+                print(f"{name:<12} {fmt:<5} {engine:<5} {len(df):>5}x{len(df.columns):<3} 载入 {med[0] * 1000:9.1f}ms  提取 {med[1] * 1000:9.1f}ms  勾稽 {med[2] * 1000:7.1f}ms  科目 {runs[-1][1]}", flush=True)
+    return records
+
+def report(records):
+    # 同一用例/格式/引擎按 label 横向对比总耗时 (ms)，最后一列相对第一列的倍数
+    df = pd.DataFrame(records)
+    if df.empty: return ""
+    df["total_ms"] = df["total"] * 1000
+    pivot = df.pivot_table(index=["case", "format", "engine"], columns="label", values="total_ms", aggfunc="last", sort=False)
+    if pivot.shape[1] > 1: pivot["倍数"] = pivot.iloc[:, -1] / pivot.iloc[:, 0]
+    return pivot.round(2).to_string()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fred ETL 性能基准：合成报表分别计时载入 / 提取 / 勾稽，结果追加写入 JSONL 便于跨版本对比")
+    ap.add_argument("-f", "--formats", default="csv,xlsx,pdf", help="输入格式，逗号分隔 (默认 csv,xlsx,pdf)")
+    ap.add_argument("-e", "--engines", default="v2.4,v1.4", help="引擎，逗号分隔 (默认 v2.4,v1.4；v1.4 只跑资产负债表)")
+    ap.add_argument("-c", "--cases", default=None, help="只跑指定用例，逗号分隔；可选: " + ",".join(c[0] for c in CASES))
+    ap.add_argument("--quick", action="store_true", help="只跑几个小用例")
+    ap.add_argument("-r", "--repeat", type=int, default=3, help="每项重复次数，取中位数 (默认 3)")
+    ap.add_argument("-o", "--out", default="fred_bench.jsonl", help="结果追加写入的 JSONL 文件 (默认 fred_bench.jsonl)")
+    ap.add_argument("--label", default=None, help="本次记录的标签 (默认取 git 提交号)")
+    ap.add_argument("--work-dir", default="fred_bench_data", help="合成样本文件目录 (默认 fred_bench_data)")
+    ap.add_argument("--report", metavar="JSONL", default=None, help="不跑基准，只按 label 对比已有记录")
+    args = ap.parse_args(argv)
+
+    if args.report:
+        with open(args.report, encoding='utf-8') as f: print(report([json.loads(l) for l in f if l.strip()]))
+        return 0
+
+    wanted = args.cases.split(",") if args.cases else (QUICK_CASES if args.quick else [c[0] for c in CASES])
+    cases = [c for c in CASES if c[0] in wanted]
+    if not cases:
+        print("没有匹配的用例", file=sys.stderr)
+        return 2
+    records = run_bench(cases, args.formats.split(","), args.engines.split(","), args.repeat, args.work_dir, args.label or git_commit() or "current")
+    with open(args.out, 'a', encoding='utf-8') as f:
+        for rec in records: f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    print(f"\n{len(records)} 条记录已追加到 {args.out}\n")
+    print(report(records))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
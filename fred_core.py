@@ -0,0 +1,891 @@
+import pandas as pd
+import numpy as np
+import re
+import os
+import json
+import time
+import pickle
+import threading
+import hashlib
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+from pandas.io.parsers import TextParser
+from fred_pdf import extract_pdf_page_tables
+
+# ==========================================
+# 1. 核心数据字典
+# ==========================================
+BS_STANDARD_MAP = {
+    "货币资金": ["货币资金", "现金及现金等价物", "银行存款", "库存现金", "Cash and cash equivalents", "Cash at bank", "Cash and bank"],
+    "交易性金融资产": ["交易性金融资产", "以公允价值计量且其变动计入当期损益的金融资产", "Trading financial assets", "Financial assets at FVTPL", r"以公允价值计量.*当期损益.*资产"],
+    "衍生金融资产": ["衍生金融资产", "Derivative financial assets"],
+    "应收票据": ["应收票据", "Notes receivable", "Bills receivable"],
+    "应收账款": ["应收账款", "应收账款账面余额", "Accounts receivable", "A/R", "Trade receivables"],
+    "坏账准备": ["坏账准备", r"[-减:：\s]*坏账准备", "Provision for bad debts"],
+    "应收账款净额": ["应收账款净额", "应收账款账面价值", "Net accounts receivable"],
+    "应收款项融资": ["应收款项融资", "Receivables financing"],
+    "预付款项": ["预付款项", "预付账款", "Prepayments", "Advances to suppliers"],
+    "其他应收款": ["其他应收款", "Other receivables"],
+    "存货": ["存货", "存货余额", "Inventories", "Inventory", "Stock"],
+    "在途物资": ["在途物资", "Materials in transit"],
+    "原材料": ["原材料", "Raw materials"],
+    "在产品": ["在产品", "Work in progress", "WIP"],
+    "库存商品": ["库存商品", "完工产品", "产成品", "Finished goods"],
+    "周转材料": ["周转材料", "包装物及低值易耗品", "Turnover materials"],
+    "委托加工物资": ["委托加工物资", "Consigned processing materials"],
+    "发出商品": ["发出商品", "Goods shipped in transit"],
+    "存货跌价准备": ["存货跌价准备", r"[-减:：\s]*存货跌价准备", "Provision for decline in value of inventories"],
+    "存货净额": ["存货净额", "存货账面价值", "Net inventories"],
+    "合同资产": ["合同资产", "Contract assets"],
+    "持有待售资产": ["持有待售资产", "Assets classified as held for sale"],
+    "一年内到期的非流动资产": ["一年内到期的非流动资产", "Non-current assets due within one year"],
+    "其他流动资产": ["其他流动资产", "Other current assets"],
+    "流动资产合计": ["流动资产合计", "流动资产总计", r"流动资产.*[合总]", "Total current assets", "Current assets total"],
+    
+    "债权投资": ["债权投资", "Debt investment"],
+    "其他债权投资": ["其他债权投资", "Other debt investment"],
+    "长期应收款": ["长期应收款", "Long-term receivables"],
+    "长期股权投资": ["长期股权投资", "Long-term equity investment", "LTI"],
+    "长期股权投资减值准备": ["长期股权投资减值准备", r"[-减:：\s]*长期股权投资减值准备"],
+    "长期股权投资净额": ["长期股权投资净额", "长期股权投资账面价值"],
+    "其他权益工具投资": ["其他权益工具投资", "Other equity instrument investment"],
+    "其他非流动金融资产": ["其他非流动金融资产", "Other non-current financial assets"],
+    "投资性房地产": ["投资性房地产", "Investment properties"],
+    "固定资产": ["固定资产原值", "固定资产原价", "固定资产", "Property, plant and equipment", "Fixed assets", "PPE"],
+    "累计折旧": ["减:累计折旧", "减：累计折旧", "累计折旧", r"[-减:：\s]*累计折旧", "Less: Accumulated depreciation"],
+    "固定资产减值准备": ["减:固定资产减值准备", "减：固定资产减值准备", "固定资产减值准备", r"[-减:：\s]*固定资产减值准备", "Less: Impairment of fixed assets"],
+    "固定资产净额": ["固定资产净额", "固定资产净值", "固定资产账面价值", "Net fixed assets"],
+    "在建工程": ["在建工程", "Construction in progress", "CIP"],
+    "生产性生物资产": ["生产性生物资产", "Productive biological assets"],
+    "油气资产": ["油气资产", "Oil and gas assets"],
+    "使用权资产": ["使用权资产", "Right-of-use assets"],
+    "无形资产": ["无形资产", "无形资产原价", "Intangible assets"],
+    "累计摊销": ["累计摊销", r"[-减:：\s]*累计摊销", "Accumulated amortization"],
+    "无形资产减值准备": ["无形资产减值准备", r"[-减:：\s]*无形资产减值准备"],
+    "无形资产净额": ["无形资产净额", "无形资产账面价值", "Net intangible assets"],
+    "开发支出": ["开发支出", "Development expenditure"],
+    "商誉": ["商誉", "Goodwill"],
+    "长期待摊费用": ["长期待摊费用", "Long-term deferred expenses", "Long-term prepaid expenses"],
+    "递延所得税资产": ["递延所得税资产", "Deferred tax assets"],
+    "其他非流动资产": ["其他非流动资产", "Other non-current assets"],
+    "非流动资产合计": ["非流动资产合计", "非流动资产总计", r"非流动资产.*[合总]", "Total non-current assets"],
+    "资产总计": ["资产总计", "资产合计", "资产总额", "Total assets"],
+
+    "短期借款": ["短期借款", "Short-term borrowings", "Short-term loans"],
+    "交易性金融负债": ["交易性金融负债", "以公允价值计量且其变动计入当期损益的金融负债", "Trading financial liabilities", r"以公允价值计量.*当期损益.*负债"],
+    "衍生金融负债": ["衍生金融负债", "Derivative financial liabilities"],
+    "应付票据": ["应付票据", "Notes payable", "Bills payable"],
+    "应付账款": ["应付账款", "Accounts payable", "A/P", "Trade payables"],
+    "预收款项": ["预收款项", "预收账款", "Advances from customers"],
+    "合同负债": ["合同负债", "Contract liabilities"],
+    "应付职工薪酬": ["应付职工薪酬", "Employee benefits payable", "Salaries payable"],
+    "应交税费": ["应交税费", "Taxes payable", "Accrued taxes"],
+    "其他应付款": ["其他应付款", "Other payables"],
+    "持有待售负债": ["持有待售负债", "Liabilities held for sale"],
+    "一年内到期的非流动负债": ["一年内到期的非流动负债", "Non-current liabilities due within one year"],
+    "其他流动负债": ["其他流动负债", "Other current liabilities"],
+    "流动负债合计": ["流动负债合计", "流动负债总计", r"流动负债.*[合总]", "Total current liabilities"],
+    
+    "长期借款": ["长期借款", "Long-term borrowings", "Long-term loans"],
+    "应付债券": ["应付债券", "Bonds payable"],
+    "租赁负债": ["租赁负债", "Lease liabilities"],
+    "长期应付款": ["长期应付款", "Long-term payables"],
+    "预计负债": ["预计负债", "Provisions"],
+    "递延收益": ["递延收益", "Deferred income"],
+    "递延所得税负债": ["递延所得税负债", "Deferred tax liabilities"],
+    "其他非流动负债": ["其他非流动负债", "Other non-current liabilities"],
+    "非流动负债合计": ["非流动负债合计", "非流动负债总计", r"非流动负债.*[合总]", "Total non-current liabilities"],
+    "负债合计": ["负债合计", "负债总额", "负债总计", r"负债.*[合总]", "Total liabilities"],
+
+    "实收资本": ["实收资本", "股本", "Paid-in capital", "Share capital", r"实收资本.*股本"],
+    "其他权益工具": ["其他权益工具", "Other equity instruments"],
+    "优先股": ["优先股", "Preferred stock", "Preferred shares"],
+    "永续债": ["永续债", "Perpetual bond"],
+    "资本公积": ["资本公积", "Capital reserve"],
+    "减:库存股": ["减:库存股", "库存股", "Less: Treasury shares"],
+    "其他综合收益": ["其他综合收益", "Other comprehensive income", "OCI"],
+    "专项储备": ["专项储备", "Special reserve"],
+    "盈余公积": ["盈余公积", "Surplus reserve", "Statutory reserve"],
+    "一般风险准备": ["一般风险准备", "General risk reserve"],
+    "未分配利润": ["未分配利润", "Retained earnings", "Undistributed profit"],
+    "归属于母公司所有者权益合计": ["归属于母公司所有者权益合计", "Equity attributable to owners of the parent"],
+    "少数股东权益": ["少数股东权益", "Minority interests", "Non-controlling interests"],
+    
+    # 💡 优化 1：彻底打补丁，涵盖所有可能的全角半角及“与/和”连接词
+    "所有者权益合计": [
+        "所有者权益合计", "股东权益合计", "所有者权益总计", "股东权益总计",
+        "所有者权益（或股东权益）合计", "所有者权益(或股东权益)合计",
+        r"所有者权益.*或.*股东权益.*[合总]计", r"所有者权益.*或股东权益.*合计", 
+        r"所有者权益.*[合总]", r"股东权益.*[合总]", r"所有者权益.*或.*",
+        "Total equity", "Total shareholders' equity"
+    ],
+    "负债和所有者权益总计": [
+        "负债和所有者权益总计", "负债和所有者权益合计", "负债及股东权益总计", 
+        "负债和所有者权益（或股东权益）总计", "负债和所有者权益(或股东权益)总计",
+        "负债与所有者权益（或股东权益）合计", "负债与所有者权益(或股东权益)合计",
+        "负债及所有者权益（或股东权益）合计", "负债及所有者权益合计",
+        r"负债.*和.*所有者权益.*总计", r"负债.*所有者权益.*或.*股东权益.*[合总]计",
+        "Total liabilities and equity"
+    ]
+}
+
+PL_STANDARD_MAP = {
+    "营业收入": ["一、营业收入", "^营业收入$", "营业收入合计"], 
+    "主营业务收入": ["其中：主营业务收入", "其中:主营业务收入", "主营业务收入"], 
+    "其他业务收入": ["其中：其他业务收入", "其中:其他业务收入", "其他业务收入"],
+    
+    "营业成本": ["减：营业成本", "减:营业成本", "^营业成本$", "营业成本合计"], 
+    "主营业务成本": ["其中：主营业务成本", "其中:主营业务成本", "主营业务成本"], 
+    "其他业务成本": ["其中：其他业务成本", "其中:其他业务成本", "其他业务成本"],
+    
+    "税金及附加": ["税金及附加", "营业税金及附加"],
+    "消费税": ["其中：消费税", "其中:消费税", "消费税"], 
+    "营业税": ["其中：营业税", "其中:营业税", "营业税"], 
+    "城市维护建设税": ["其中：城市维护建设税", "其中:城市维护建设税", "城市维护建设税"], 
+    "资源税": ["其中：资源税", "其中:资源税", "资源税"], 
+    "教育费附加": ["其中：教育费附加", "其中:教育费附加", "教育费附加"], 
+    "城镇土地使用税": ["其中：城镇土地使用税", "其中:城镇土地使用税", "城镇土地使用税"],
+    "房产税": ["其中：房产税", "其中:房产税", "房产税"],
+    "车船税": ["其中：车船税", "其中:车船税", "车船税"],
+    "印花税": ["其中：印花税", "其中:印花税", "印花税"],
+    "销售费用": ["销售费用", "营业费用"],
+    "广告及宣传费": ["其中：广告费和业务宣传费", "其中:广告费和业务宣传费", "广告费和业务宣传费", "其中：广告费", "其中:广告费", "其中：业务宣传费", "其中:业务宣传费", "广告费", "业务宣传费", "广告及宣传费"],
+    "商品维修费": ["其中：商品维修费", "其中:商品维修费", "商品维修费"],
+    "运输费": ["其中：运输费", "其中:运输费", "运输费"],
+    "包装费": ["其中：包装费", "其中:包装费", "包装费"],
+    "管理费用": ["管理费用"],
+    "开办费": ["其中：开办费", "其中:开办费", "开办费"], 
+    "业务招待费": ["其中：业务招待费", "其中:业务招待费", "业务招待费"],
+    "办公费": ["其中：办公费", "其中:办公费", "办公费"],
+    "折旧及摊销": ["其中：折旧费", "其中：摊销费", "折旧及摊销", "折旧费"],
+    "研发费用": ["研发费用"],
+    "财务费用": ["财务费用"],
+    "利息费用": ["其中：利息费用", "其中:利息费用", "利息费用", "利息支出"], 
+    "利息收入": ["其中：利息收入", "其中:利息收入", "利息收入"], 
+    "汇兑净损失": ["其中：汇兑净损失", "其中:汇兑净损失", "汇兑净损失", "汇兑损益"], 
+    "手续费": ["其中：手续费", "其中:手续费", "手续费"],
+    "其他收益": ["加：其他收益", "加:其他收益", "其他收益"],
+    "投资收益": ["加：投资收益", "加:投资收益", "投资收益"],
+    "对联营企业和合营企业的投资收益": ["其中：对联营企业和合营企业的投资收益", "其中:对联营企业和合营企业的投资收益"], 
+    "公允价值变动收益": ["加：公允价值变动收益", "加:公允价值变动收益", "公允价值变动收益"],
+    "信用减值损失": ["减：信用减值损失", "信用减值损失"],
+    "资产减值损失": ["减：资产减值损失", "资产减值损失"],
+    "资产处置收益": ["加：资产处置收益", "资产处置收益"],
+    "营业利润": ["二、营业利润", "营业利润"],
+    "营业外收入": ["加：营业外收入", "加:营业外收入", "营业外收入"],
+    "非流动资产处置利得": ["其中：非流动资产处置利得", "其中:非流动资产处置利得"], 
+    "营业外支出": ["减：营业外支出", "减:营业外支出", "营业外支出"],
+    "非流动资产处置损失": ["其中：非流动资产处置损失", "其中:非流动资产处置损失"], 
+    "利润总额": ["三、利润总额", "利润总额"],
+    "所得税费用": ["减：所得税费用", "减:所得税费用", "所得税费用"],
+    "净利润": ["四、净利润", "净利润"],
+    "持续经营净利润": ["（一）持续经营净利润", "(一)持续经营净利润", "持续经营净利润"],
+    "终止经营净利润": ["（二）终止经营净利润", "(二)终止经营净利润", "终止经营净利润"],
+    "归属于母公司所有者的净利润": ["归属于母公司所有者的净利润", "归属于母公司股东的净利润"],
+    "少数股东损益": ["少数股东损益"],
+    "综合收益总额": ["五、综合收益总额", "综合收益总额"]
+}
+
+BS_COL_MAP = {
+    "P2": ["期末", "本期", "本年余额", "期末数", "期末余额", "本期数", "本期金额", "本年期末", "Ending", "Closing balance"], 
+    "P1": ["期初", "年初", "上年余额", "期初数", "期初余额", "年初数", "年初余额", "上年年末余额", "上期年末余额", "上年数", "上期数", "上年同期", "Opening", "Beginning balance"]
+}
+
+PL_COL_MAP = {
+    "P1": ["本期", "本月", "本月数", "本期数", "本期金额", "本月金额", "本期发生额"], 
+    "P2": ["累计", "本年累计", "本期累计", "本年累计数", "本期累计数", "本期累积数", "本年累积数", "上期金额", "上期发生额", "上期数"]
+}
+
+# 标准化清单的两列 (P1/P2) 名称
+PERIOD_NAMES = {"BS": {"P1": "期初余额", "P2": "期末余额"}, "PL": {"P1": "本期金额", "P2": "累计金额"}}
+
+# 报表标题 (归一化后：去空格、小写)，用于 PDF 报表页定位
+STATEMENT_TITLES = {
+    "BS": ["资产负债表", "balancesheet", "statementoffinancialposition"],
+    "PL": ["利润表", "损益表", "incomestatement", "statementofprofitorloss", "profitandloss"]
+}
+
+# 字典版本号：任何别名/表头改动都会改变它，缓存键带上它即可自动失效
+MAP_VERSION = hashlib.sha1(json.dumps([BS_STANDARD_MAP, PL_STANDARD_MAP, BS_COL_MAP, PL_COL_MAP, STATEMENT_TITLES], ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+# 取数引擎版本号：label_ok / value_candidates / find_target_cols 等取数规则或 PDF 报表页定位规则改动时手动加一，落盘的版式库与解析/命中缓存随之失效
+ENGINE_VERSION = 2
+
+# ==========================================
+# 2. V1.3.3 原味处理函数
+# ==========================================
+# 运行诊断：分段耗时 + 热点计数；没有 profiling() 时各埋点直接跳过
+_PROFILE = contextvars.ContextVar("fred_profile", default=None)
+
+class Profile:
+    def __init__(self):
+        self.stages, self.counters, self.accounts = OrderedDict(), OrderedDict(), OrderedDict()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def account(self, table_type, k, counts):
+        acc = self.accounts.setdefault((table_type, k), {})
+        for name, n in counts.items(): acc[name] = acc.get(name, 0) + n
+
+    def as_dict(self):
+        return {"stages": {k: round(v, 4) for k, v in self.stages.items()}, "counters": dict(self.counters),
+                "accounts": [{"报表": t, "科目": k, **c} for (t, k), c in self.accounts.items()]}
+
+@contextmanager
+def profiling(profile=None):
+    # with profiling() as prof: run_statements(...)；prof.as_dict() 即结构化结果
+    profile = profile or Profile()
+    token = _PROFILE.set(profile)
+    try:
+        yield profile
+    finally:
+        _PROFILE.reset(token)
+
+@contextmanager
+def stage(name):
+    prof, t0 = _PROFILE.get(), time.perf_counter()
+    try:
+        yield
+    finally:
+        if prof is not None: prof.stages[name] = prof.stages.get(name, 0.0) + time.perf_counter() - t0
+
+def count(name, n=1):
+    prof = _PROFILE.get()
+    if prof is not None: prof.count(name, n)
+
+# 进度订阅：后台任务用 watching(回调) 接收逐页 / 逐科目进度；没有订阅时各埋点直接跳过
+_PROGRESS = contextvars.ContextVar("fred_progress", default=None)
+
+@contextmanager
+def watching(callback):
+    token = _PROGRESS.set(callback)
+    try:
+        yield callback
+    finally:
+        _PROGRESS.reset(token)
+
+def notify(event, **info):
+    watch = _PROGRESS.get()
+    if watch is not None: watch(event, **info)
+
+def clean_num_frame(data):
+    # 原逐格 clean_num 的整列/整表向量化版本：返回 (数值矩阵, 非数字掩码)，逐格规则不变 (python fred_parity.py 与原版对照)
+    vals = data.to_numpy(dtype=object)
+    s = pd.Series(vals.ravel(), dtype=object)
+    is_na = s.isna().to_numpy()
+    t = s.astype(str).str.replace(r'[^0-9.\-()]', '', regex=True)
+    paren = (t.str.startswith('(') & t.str.endswith(')')).to_numpy()
+    t[paren] = '-' + t[paren].str[1:-1]
+    m = t.str.extract(r'(-?\d+\.\d{1,4}|-?\d{4,})', expand=False)
+    has = m.notna().to_numpy()
+
+    out = np.zeros(len(s))
+    out[has] = m[has].to_numpy().astype(float)
+    note_no = has & (out != 0) & (np.floor(out) == out) & (np.abs(out) >= 1) & (np.abs(out) <= 400)
+    out[has] = [round(v, 2) for v in out[has].tolist()]
+    not_num = note_no | (~has & ~t.isin(['-', '0', '']).to_numpy())
+    not_num &= ~is_na
+    out[not_num | is_na] = 0.0
+    return out.reshape(vals.shape), not_num.reshape(vals.shape)
+
+def file_name(file):
+    return os.fspath(file) if isinstance(file, (str, os.PathLike)) else file.name
+
+def file_digest(file):
+    # 按文件内容取 sha256，作为缓存键与结果库的文件 id
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f: data = f.read()
+    else:
+        data = file.getvalue()
+    return hashlib.sha256(data).hexdigest()
+
+STATEMENT_TYPES = ["BS", "PL"]
+XLSX_SCAN_ROWS = 60
+XLSX_MAX_COLS = int(os.environ.get("FRED_XLSX_MAX_COLS", 0)) or None
+MIN_SHEET_ACCOUNTS = 3
+
+def rows_score(rows):
+    # 各报表类型在这些行的文字格里命中的不同科目数
+    accounts = {t: set() for t in STATEMENT_TYPES}
+    for row in rows:
+        for x in row:
+            if not isinstance(x, str): continue
+            for t in STATEMENT_TYPES: accounts[t] |= match_accounts(ALIAS_MATCHERS[t], norm_txt(x))
+    return {t: len(a) for t, a in accounts.items()}
+
+def xlsx_sheet_score(ws):
+    # 只扫前若干行；行数取声明的维度，缺失时流式数一遍
+    n_rows = ws.max_row if ws.max_row is not None else sum(1 for _ in ws.iter_rows(values_only=True))
+    return rows_score(ws.iter_rows(max_row=XLSX_SCAN_ROWS, values_only=True)), n_rows
+
+def pick_statement_sheets(scores):
+    # scores: 各表 ({类型: 科目数}, 行数)。每张表归入命中更多的类型，各类型取其中最好的一张；
+    # 没有专属表的类型回退到整体最像报表的那张 (科目数优先、行数其次)
+    best = max(range(len(scores)), key=lambda i: (max(scores[i][0].values()), scores[i][1]))
+    picks = {}
+    for t in STATEMENT_TYPES:
+        own = [i for i, (sc, n) in enumerate(scores) if sc[t] >= MIN_SHEET_ACCOUNTS and sc[t] == max(sc.values())]
+        picks[t] = max(own, key=lambda i: (scores[i][0][t], scores[i][1])) if own else best
+    return picks
+
+def xlsx_cell(cell):
+    # 与 pandas 的 openpyxl 读取器一致：空格为 ""、错误值为 NaN、整数值的数字转 int
+    if cell.value is None: return ""
+    if cell.data_type == 'e': return np.nan
+    if cell.data_type == 'n':
+        v = int(cell.value)
+        return v if v == cell.value else float(cell.value)
+    return cell.value
+
+def read_xlsx_sheet(ws, max_cols=None):
+    # 按实际使用区域逐行流式读取；max_cols 可截掉整列设了格式导致的超宽空列
+    ws.reset_dimensions()
+    data = []
+    for row in ws.iter_rows(max_col=max_cols):
+        vals = [xlsx_cell(c) for c in row]
+        while vals and vals[-1] == "": vals.pop()
+        data.append(vals)
+    while data and not data[-1]: data.pop()
+    if not data: return pd.DataFrame()
+    width = max(len(r) for r in data)
+    return TextParser([r + [""] * (width - len(r)) for r in data], header=None, skip_blank_lines=False).read()
+
+def load_xlsx(file, max_cols=None):
+    # 只读模式打开，不把每张明细表都建成 DataFrame；按类型挑出报表所在的表再完整读取 (BS/PL 同表只读一次)
+    from openpyxl import load_workbook
+    wb = load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheets = wb.worksheets
+        picks = pick_statement_sheets([xlsx_sheet_score(ws) for ws in sheets])
+        frames = {i: read_xlsx_sheet(sheets[i], max_cols) for i in set(picks.values())}
+        return {t: (frames[i], sheets[i].title) for t, i in picks.items()}
+    finally:
+        wb.close()
+
+def load_pdf(file, pdf_workers=None, locate_pages=False):
+    # 报表页按类型分块；某类没有专属页 (或未做定位) 时用全部抽到的表格，与原单表流程一致
+    page_types = {}
+    def page_filter(texts):
+        with stage("PDF 报表页定位"): page_types.update(classify_statement_pages(texts))
+        count("PDF 总页数", len(texts))
+        return list(page_types)
+    progress = lambda phase, done, total: notify("pages", phase=phase, done=done, total=total)
+    page_tables = extract_pdf_page_tables(file, pdf_workers, page_filter if locate_pages else None, progress)
+    count("PDF 抽表页数", len(page_tables))
+    # 两类落在同一组页 (含都回退到全部页) 时共用同一个 DataFrame，归一化只做一次
+    out, frames = {}, {}
+    for t in STATEMENT_TYPES:
+        own = [(i, tables) for i, tables in page_tables if t in page_types.get(i, ())] or page_tables
+        pages = tuple(i for i, _ in own)
+        if pages not in frames: frames[pages] = pd.concat([pd.DataFrame(tb) for _, tables in own for tb in tables])
+        out[t] = (frames[pages], "第 " + ", ".join(str(i + 1) for i in pages) + " 页")
+    return out
+
+def load_statements(file, pdf_workers=None, locate_pages=False):
+    # 一次解析整份文件，返回 {报表类型: (原始表, 来源说明)}；两类落在同一张表时共用同一个 DataFrame
+    ext = file_name(file).split('.')[-1].lower()
+    if ext == 'xlsx':
+        return load_xlsx(file, XLSX_MAX_COLS)
+    elif ext == 'xls':
+        try:
+            xls = pd.read_excel(file, sheet_name=None, header=None, engine='xlrd')
+        except ImportError:
+            raise ImportError("缺少 `xlrd` 库。\n终端输入: `pip install xlrd`\n或者把文件另存为 .xlsx")
+        names = list(xls)
+        picks = pick_statement_sheets([(rows_score(df.head(XLSX_SCAN_ROWS).itertuples(index=False)), len(df)) for df in xls.values()])
+        return {t: (xls[names[i]], names[i]) for t, i in picks.items()}
+    elif ext == 'pdf':
+        return load_pdf(file, pdf_workers, locate_pages)
+    raw = pd.read_csv(file, header=None)
+    return {t: (raw, None) for t in STATEMENT_TYPES}
+
+def norm_txt(x):
+    return str(x).replace("\n", "").replace(" ", "").replace("　", "").lower()
+
+def normalize_sheet(df):
+    # 一次性归一化整张表：载入之后只做一次，所有科目取数共享，避免逐科目逐期间重复 iloc + 清洗
+    vals = df.to_numpy(dtype=object)
+    txt = [[norm_txt(x) for x in row] for row in vals]
+    num, not_num = clean_num_frame(df)
+    count("clean_num 单元格", num.size)
+    return {
+        "n_rows": len(df), "n_cols": len(df.columns),
+        "txt": txt,
+        "filled": [[bool(t) and t != 'nan' for t in row] for row in txt],
+        "num": num, "not_num": not_num,
+    }
+
+def is_regex_alias(a):
+    return a.startswith(r'^') or '.*' in a
+
+def build_alias_matcher(std_map):
+    # 字面别名合并进一台 Aho-Corasick 自动机，正则别名 (^ / .*) 预编译；一次扫描返回该格命中的全部标准科目
+    goto, fail, out, regexes = [{}], [0], [set()], []
+    for k, aliases in std_map.items():
+        for a in aliases:
+            if is_regex_alias(a):
+                regexes.append((re.compile(a.lower()), k))
+                continue
+            node = 0
+            for ch in a.lower():
+                if ch not in goto[node]:
+                    goto[node][ch] = len(goto)
+                    goto.append({}); fail.append(0); out.append(set())
+                node = goto[node][ch]
+            out[node].add(k)
+
+    queue = list(goto[0].values())
+    for node in queue:
+        for ch, nxt in goto[node].items():
+            f = fail[node]
+            while f and ch not in goto[f]: f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] |= out[fail[nxt]]
+            queue.append(nxt)
+    return {"goto": goto, "fail": fail, "out": [frozenset(o) for o in out], "regexes": regexes}
+
+def match_accounts(matcher, text, regex_counts=None):
+    goto, fail, out = matcher["goto"], matcher["fail"], matcher["out"]
+    found, node = set(), 0
+    for ch in text:
+        while node and ch not in goto[node]: node = fail[node]
+        node = goto[node].get(ch, 0)
+        if out[node]: found |= out[node]
+    for rx, k in matcher["regexes"]:
+        if k in found: continue
+        if regex_counts is not None: regex_counts[k] = regex_counts.get(k, 0) + 1
+        if rx.search(text): found.add(k)
+    return found
+
+ALIAS_MATCHERS = {"BS": build_alias_matcher(BS_STANDARD_MAP), "PL": build_alias_matcher(PL_STANDARD_MAP)}
+
+def sheet_alias_hits(sheet, table_type):
+    # 每个单元格只过一次匹配器，按科目建倒排表；列表保持行优先顺序，与原逐格扫描的先后一致
+    # BS/PL 共用同一张表 (sheet["types"]) 时一趟扫描同时建好两类索引
+    cache = sheet.setdefault("alias_hits", {})
+    if (table_type, MAP_VERSION) not in cache:
+        types = [t for t in dict.fromkeys([table_type] + sheet.get("types", [])) if (t, MAP_VERSION) not in cache]
+        prof, idx, scanned = _PROFILE.get(), {t: {} for t in types}, 0
+        rx_counts = {t: {} if prof else None for t in types}
+        with stage("别名索引"):
+            for r in range(sheet["n_rows"]):
+                for c in range(sheet["n_cols"]):
+                    if not sheet["filled"][r][c]: continue
+                    scanned += 1
+                    for t in types:
+                        for k in match_accounts(ALIAS_MATCHERS[t], sheet["txt"][r][c], rx_counts[t]): idx[t].setdefault(k, []).append((r, c))
+        for t in types: cache[(t, MAP_VERSION)] = idx[t]
+        if prof:
+            prof.count("别名扫描格", scanned)
+            for t in types:
+                prof.count("正则匹配次数", sum(rx_counts[t].values()))
+                for k, n in rx_counts[t].items(): prof.account(t, k, {"正则": n})
+    return cache[(table_type, MAP_VERSION)]
+
+def patch_alias_hits(sheet, table_type, accounts, base_version):
+    # 别名字典小改后的增量索引：沿用旧字典版本的倒排表，只为改动过的科目重扫一遍单元格
+    cache = sheet.setdefault("alias_hits", {})
+    base = cache.get((table_type, base_version))
+    if base is None or (table_type, MAP_VERSION) in cache: return sheet_alias_hits(sheet, table_type)
+    std_map = BS_STANDARD_MAP if table_type == "BS" else PL_STANDARD_MAP
+    matcher = build_alias_matcher({k: std_map[k] for k in accounts if k in std_map})
+    idx = {k: v for k, v in base.items() if k in std_map and k not in accounts}
+    with stage("别名索引·增量"):
+        for r in range(sheet["n_rows"]):
+            for c in range(sheet["n_cols"]):
+                if not sheet["filled"][r][c]: continue
+                for k in match_accounts(matcher, sheet["txt"][r][c]): idx.setdefault(k, []).append((r, c))
+    cache[(table_type, MAP_VERSION)] = idx
+    return idx
+
+def find_target_cols(sheet, table_type, period_key):
+    col_aliases = [a.lower() for a in (BS_COL_MAP if table_type == "BS" else PL_COL_MAP)[period_key]]
+    txt, filled, target_cols = sheet["txt"], sheet["filled"], []
+    for r in range(min(20, sheet["n_rows"])):
+        for c in range(sheet["n_cols"]):
+            if not filled[r][c]: continue
+            cell_txt = txt[r][c]
+            if any((al in cell_txt) or (cell_txt in al and len(cell_txt) >= 2) for al in col_aliases):
+                if c not in target_cols: target_cols.append(c)
+    return target_cols
+
+def label_ok(raw, row_key, alias_str, table_type):
+    # 命中别名后的排除规则 (与期间无关，每个标签格只判一次)
+    if "流动" in raw and "流动" not in alias_str: return False
+    if "非流动" in raw and "非" not in alias_str: return False
+        
+    if table_type == "BS":
+        for ex in ["其中", "减值", "准备", "跌价", "折旧", "摊销", "清理", "减:", "减：", "加:", "加：", "加项", "减项", "+"]:
+            if ex in raw and ex not in alias_str: return False
+            
+        if (raw.startswith("-") or raw.startswith("减")) and not any(kw in alias_str for kw in ["折旧", "摊销", "准备", "坏账", "减:"]):
+            return False
+    else:
+        if "其中" in raw and "其中" not in alias_str: return False
+        if row_key == "营业税" and "附加" in raw: return False
+        if row_key == "消费税" and "附加" in raw: return False
+            
+        if row_key == "营业收入" and any(x in raw for x in ["主营", "其他", "外"]): return False
+        if row_key == "营业成本" and any(x in raw for x in ["主营", "其他", "外"]): return False
+        if row_key == "主营业务收入" and "成本" in raw: return False
+        if row_key == "主营业务成本" and "收入" in raw: return False
+        if row_key == "其他业务收入" and "成本" in raw: return False
+        if row_key == "其他业务成本" and "收入" in raw: return False
+            
+    if row_key == "其他权益工具" and "投资" in raw: return False
+    return True
+
+def value_candidates(sheet, r, c, target_cols):
+    # 标签格 (r, c) 的取数顺序：本行/下一行 → 目标列及其右邻 → 标签右侧逐列
+    n_rows, n_cols = sheet["n_rows"], sheet["n_cols"]
+    for row_offset in [0, 1]: 
+        check_r = r + row_offset
+        if check_r >= n_rows: continue
+        for tc in [tc for tc in target_cols if tc >= c]:
+            for off in [0, 1]:  
+                if tc + off < n_cols: yield check_r, tc+off
+        for bc in range(c + 1, n_cols): yield check_r, bc
+
+def first_value(sheet, labels, target_cols, used_cells=None, stats=None):
+    num, not_num = sheet["num"], sheet["not_num"]
+    for r, c in labels:
+        for check_r, col in value_candidates(sheet, r, c, target_cols):
+            if stats is not None: stats["取数格"] += 1
+            if used_cells is not None and (check_r, col) in used_cells: continue
+            if not not_num[check_r, col]: return float(num[check_r, col]), check_r, col
+    return 0.0, -1, -1
+
+def extract_statement(sheet, table_type="BS", accounts=None, base_hits=None):
+    # 单次引擎：两个期间的目标列只识别一次，标签格排除规则两期间共用；按科目顺序出数，PL 已用单元格去重与原版逐科目搜索完全一致
+    # accounts 给定时只重算这些科目，其余沿用 base_hits (字典回归用)
+    map_dict = BS_STANDARD_MAP if table_type == "BS" else PL_STANDARD_MAP
+    targets = {p: find_target_cols(sheet, table_type, p) for p in ["P1", "P2"]}
+    used = {p: set() for p in targets} if table_type == "PL" else {p: None for p in targets}
+    alias_hits, txt, hits, prof, watch = sheet_alias_hits(sheet, table_type), sheet["txt"], {}, _PROFILE.get(), _PROGRESS.get()
+    
+    with stage("取数"):
+        for k, aliases in map_dict.items():
+            if accounts is not None and k not in accounts:
+                for p in ["P1", "P2"]:
+                    r, c, v = hits[(k, p)] = base_hits[(k, p)]
+                    if used[p] is not None and r != -1: used[p].add((r, c))
+                continue
+            alias_str = str(aliases)
+            labels = [(r, c) for r, c in alias_hits.get(k, []) if label_ok(txt[r][c], k, alias_str, table_type)]
+            stats = {"取数格": 0} if prof else None
+            for p in ["P1", "P2"]:
+                v, r, c = first_value(sheet, labels, targets[p], used[p], stats) if targets[p] else (0.0, -1, -1)
+                if used[p] is not None and r != -1: used[p].add((r, c))
+                hits[(k, p)] = (r, c, v)
+            if prof: prof.account(table_type, k, {"标签格": len(labels), **stats})
+            if watch: watch("account", table_type=table_type, account=k, hits={(k, p): hits[(k, p)] for p in ["P1", "P2"]})
+            # PL 按顺序占用单元格：某科目取数一变，后面的科目都可能换格，从这里起全部重算
+            if table_type == "PL" and accounts is not None and any(hits[(k, p)] != base_hits.get((k, p)) for p in ["P1", "P2"]): accounts = None
+    return hits
+
+# 其他报表/附注的标题：续页碰到它们即止，不再往后延伸
+OTHER_STATEMENT_TITLES = ["现金流量表", "所有者权益变动表", "股东权益变动表", "报表附注", "cashflow", "changesinequity"]
+MAX_CONTINUATION_PAGES = 3
+
+def title_line(lines, titles):
+    # 标题行要短，排除附注里“资产负债表日”之类的正文
+    return any(tt in l and len(l) <= len(tt) + 10 and "日" not in l for l in lines for tt in titles)
+
+def classify_statement_pages(texts, min_accounts=8):
+    # PDF 预扫描：只看页面文字，按报表标题 + 科目别名命中数判断该页是否像资产负债表/利润表
+    # 返回 {页号: {报表类型}}；一页可同时属于两类 (小报表同页排版)
+    scores, titles = [], []
+    for text in texts:
+        lines = [l for l in (norm_txt(l) for l in text.splitlines()) if l]
+        page = {}
+        for t in ["BS", "PL"]:
+            accounts = set()
+            for l in lines: accounts |= match_accounts(ALIAS_MATCHERS[t], l)
+            page[t] = (title_line(lines, STATEMENT_TITLES[t]), len(accounts))
+        scores.append(page)
+        titles.append({t for t in page if page[t][0]} | ({"other"} if title_line(lines, OTHER_STATEMENT_TITLES) else set()))
+
+    # 带现金流量表/附注等标题的页，只有同时带本类标题才算本类 (附注表格里科目名同样成片)
+    own = [{t for t, (has_title, n_acc) in page.items() if (n_acc >= min_accounts and "other" not in tl) or (has_title and n_acc >= 3)} for page, tl in zip(scores, titles)]
+    pages = {i: set(types) for i, types in enumerate(own) if types}
+    # 报表跨页：紧随其后、仍成片命中该类科目 (至少 min_accounts 的一半) 的续页一并保留，只归入该类
+    # 碰到别的报表标题即止，最多 MAX_CONTINUATION_PAGES 页；附注里零星提到科目名的页不算
+    min_rows = max(1, min_accounts // 2)
+    for i, types in enumerate(own):
+        for t in types:
+            j = i + 1
+            while j < len(scores) and j <= i + MAX_CONTINUATION_PAGES and not own[j] and not titles[j] - {t} and scores[j][t][1] >= min_rows:
+                pages.setdefault(j, set()).add(t)
+                j += 1
+    return dict(sorted(pages.items()))
+
+class ResultCache:
+    # 按文件内容哈希缓存解析结果与提取结果：内存 LRU 有上限，可选落盘 (FRED_CACHE_DIR)
+    # 界面的后台任务会在多个线程里同时读写，LRU 的增删挪动都在锁内完成
+    def __init__(self, max_items=32, disk_dir=None):
+        self.max_items, self.disk_dir, self.mem, self.lock = max_items, disk_dir, OrderedDict(), threading.RLock()
+        if disk_dir: os.makedirs(disk_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1("|".join(map(str, key)).encode('utf-8')).hexdigest() + ".pkl")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.mem:
+                self.mem.move_to_end(key)
+                return self.mem[key]
+        if self.disk_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), 'rb') as f: val = pickle.load(f)
+            except Exception: return None
+            self._remember(key, val)
+            return val
+        return None
+
+    def put(self, key, val):
+        self._remember(key, val)
+        if self.disk_dir:
+            tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f: pickle.dump(val, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+
+    def _remember(self, key, val):
+        with self.lock:
+            self.mem[key] = val
+            self.mem.move_to_end(key)
+            while len(self.mem) > self.max_items: self.mem.popitem(last=False)
+
+LAYOUT_DIGITS = re.compile(r'\d')
+
+def layout_fingerprint(sheet, table_type):
+    # 版式指纹：表格尺寸 + 各文字格的位置与内容 (去掉数字，期间/日期变化不影响) + 非数字格分布
+    # 同一填报人每月沿用同一模板时指纹不变，取数坐标可以直接复用
+    h = hashlib.sha1(f"{table_type}|{MAP_VERSION}|{ENGINE_VERSION}|{sheet['n_rows']}x{sheet['n_cols']}".encode('utf-8'))
+    txt, filled, parts = sheet["txt"], sheet["filled"], []
+    for r in range(sheet["n_rows"]):
+        for c in range(sheet["n_cols"]):
+            if not filled[r][c]: continue
+            label = LAYOUT_DIGITS.sub('', txt[r][c])
+            if label.strip(".,-()%+ "): parts.append(f"{r},{c}:{label}")
+    h.update("\n".join(parts).encode('utf-8'))
+    h.update(np.packbits(sheet["not_num"]).tobytes())
+    return h.hexdigest()
+
+def read_layout(sheet, coords):
+    # 按已知坐标直接取数；任一坐标越界或已不是数字即视为版式不符，返回 None 走全量搜索
+    num, not_num, hits = sheet["num"], sheet["not_num"], {}
+    for kp, (r, c) in coords.items():
+        if r == -1:
+            hits[kp] = (-1, -1, 0.0)
+            continue
+        if r >= sheet["n_rows"] or c >= sheet["n_cols"] or not_num[r, c]: return None
+        hits[kp] = (r, c, float(num[r, c]))
+    return hits
+
+def extract_with_layout(sheet, table_type, layouts=None):
+    if layouts is None: return extract_statement(sheet, table_type)
+    with stage("版式指纹"):
+        layout_key = ("layout", table_type, MAP_VERSION, layout_fingerprint(sheet, table_type))
+        coords = layouts.get(layout_key)
+        hits = read_layout(sheet, coords) if coords is not None else None
+    count("版式命中" if hits is not None else "版式未命中")
+    if hits is None:
+        hits = extract_statement(sheet, table_type)
+        layouts.put(layout_key, {kp: (r, c) for kp, (r, c, v) in hits.items()})
+    return hits
+
+def sheet_cache_key(ext, file_key, locate_pages):
+    # PDF 报表页定位与 Excel 选表都依赖别名字典与定位规则，任一变了要重新解析；PDF 定位与否解析出的表不同，键里必须区分
+    return ("sheets", ext, file_key, f"{MAP_VERSION}|{ENGINE_VERSION}" if (locate_pages and ext == 'pdf') or ext in ('xlsx', 'xls') else "all")
+
+def load_sheets(up, cache=None, pdf_workers=None, locate_pages=True):
+    # up 可以是 Streamlit 上传对象，也可以是本地文件路径 (批处理)
+    # 一份文件只解析一次：{报表类型: (原始表, 归一化表, 来源)}，BS/PL 落在同一张表时只归一化一次
+    ext = file_name(up).split('.')[-1].lower()
+    file_key = file_digest(up)
+    sheet_key = sheet_cache_key(ext, file_key, locate_pages)
+    parsed = cache.get(sheet_key) if cache else None
+    if cache: count("缓存命中·解析" if parsed is not None else "缓存未命中·解析")
+    if parsed is None:
+        parsed, norm = {}, {}
+        with stage("载入文件"): loaded = load_statements(up, pdf_workers, locate_pages)
+        for t, (raw, source) in loaded.items():
+            if id(raw) not in norm:
+                with stage("归一化"): norm[id(raw)] = normalize_sheet(raw)
+            norm[id(raw)].setdefault("types", []).append(t)
+            parsed[t] = (raw, norm[id(raw)], source)
+        if cache: cache.put(sheet_key, parsed)
+    return ext, file_key, parsed
+
+def extract_statements(up, table_types=STATEMENT_TYPES, cache=None, pdf_workers=None, locate_pages=True, layouts=None):
+    # 返回 {报表类型: (原始表, 归一化表, 命中, 来源)}
+    ext, file_key, parsed = load_sheets(up, cache, pdf_workers, locate_pages)
+    # 命中依附于解析出的那张表：键沿用解析键 (含是否做了 PDF 页定位)，再加报表类型、字典版本与取数引擎版本
+    hits_key = lambda t: ("hits", t, MAP_VERSION, ENGINE_VERSION) + sheet_cache_key(ext, file_key, locate_pages)[1:]
+    out = {}
+    for t in table_types:
+        raw, sheet, source = parsed[t]
+        hits = cache.get(hits_key(t)) if cache else None
+        if cache: count("缓存命中·提取" if hits is not None else "缓存未命中·提取")
+        if hits is None:
+            # 版式库默认与结果缓存共用；批处理可单独指定一个落盘目录长期保存
+            hits = extract_with_layout(sheet, t, layouts if layouts is not None else cache)
+            if cache: cache.put(hits_key(t), hits)
+        notify("statement", table_type=t, hits=hits)
+        out[t] = (raw, sheet, dict(hits), source)
+    return out
+
+# ==========================================
+# 3. 业务逻辑计算 (V1.3.3 原汁原味)
+# ==========================================
+# 勾稽规则表：推算 (derive)、校验 (check)、穿透展示 (drill) 只在这里定义一次，提取、校验、界面共用
+# 数值 = Σplus - Σminus (minus 可取绝对值)；derive 仅在目标为 0 且满足 if 条件时写入
+#   if: "lead" 首项非 0 | "any" 任一项非 0 | "all" 全部项非 0 | "result" 结果非 0 | [科目...] 指定科目均非 0 | None 总是
+PL_TAX_SUBS = ["消费税", "营业税", "城市维护建设税", "资源税", "教育费附加", "城镇土地使用税", "房产税", "车船税", "印花税"]
+
+RECON_RULES = {
+    "BS": [
+        {"type": "derive", "target": "固定资产净额", "plus": ["固定资产"], "minus": ["累计折旧", "固定资产减值准备"], "abs_minus": True, "if": "lead"},
+        {"type": "derive", "target": "无形资产净额", "plus": ["无形资产"], "minus": ["累计摊销", "无形资产减值准备"], "abs_minus": True, "if": "lead"},
+        {"type": "derive", "target": "存货净额", "plus": ["存货"], "minus": ["存货跌价准备"], "abs_minus": True, "if": "lead"},
+        {"type": "derive", "target": "应收账款净额", "plus": ["应收账款"], "minus": ["坏账准备"], "abs_minus": True, "if": "lead"},
+        {"type": "derive", "target": "长期股权投资净额", "plus": ["长期股权投资"], "minus": ["长期股权投资减值准备"], "abs_minus": True, "if": "lead"},
+        {"type": "derive", "target": "资产总计", "plus": ["流动资产合计", "非流动资产合计"], "if": "any"},
+        {"type": "derive", "target": "负债合计", "plus": ["流动负债合计", "非流动负债合计"], "if": "any"},
+        # 资产 = 负债 + 权益：三者缺一时反推 (条件互斥，顺序执行等价于原 if/elif)
+        {"type": "derive", "target": "资产总计", "plus": ["负债合计", "所有者权益合计"], "if": "all"},
+        {"type": "derive", "target": "负债合计", "plus": ["资产总计"], "minus": ["所有者权益合计"], "if": "all"},
+        {"type": "derive", "target": "所有者权益合计", "plus": ["资产总计"], "minus": ["负债合计"], "if": "all"},
+        {"type": "check", "name": "资产负债表失衡", "plus": ["资产总计"], "minus": ["负债合计", "所有者权益合计"], "if": None},
+    ],
+    "PL": [
+        # 💡 优化 2：利用子项反推父项，严格贯彻“主营+其他=营业”
+        {"type": "derive", "target": "营业收入", "plus": ["主营业务收入", "其他业务收入"], "if": "result", "drill": True},
+        {"type": "derive", "target": "营业成本", "plus": ["主营业务成本", "其他业务成本"], "if": "result", "drill": True},
+        {"type": "derive", "target": "税金及附加", "plus": PL_TAX_SUBS, "if": "result", "drill": True},
+        {"type": "drill", "target": "销售费用", "plus": ["广告及宣传费", "商品维修费", "运输费", "包装费"]},
+        {"type": "drill", "target": "管理费用", "plus": ["开办费", "业务招待费", "办公费", "折旧及摊销"]},
+        {"type": "drill", "target": "财务费用", "plus": ["利息费用", "利息收入", "汇兑净损失", "手续费"]},
+        {"type": "check", "name": "存在差异(利润总额-所得税与净利润不符)", "plus": ["利润总额"], "minus": ["所得税费用", "净利润"], "if": ["利润总额", "净利润"]},
+    ]
+}
+
+def rule_terms(rule):
+    return rule.get("plus", []) + rule.get("minus", [])
+
+def rule_row(V, idx, a):
+    # 字典里删掉/改名的科目按全 0 处理，与原 v() / get_pl_v() 取不到即 0.0 一致
+    return V[idx[a]] if a in idx else np.zeros(V.shape[1])
+
+def eval_rule(rule, V, idx):
+    # 对所有列 (期间 × 文件) 一次性计算规则右侧的值与触发条件
+    plus, minus = rule.get("plus", []), rule.get("minus", [])
+    row = lambda a: rule_row(V, idx, a)
+    val = row(plus[0]).copy()
+    for a in plus[1:]: val = val + row(a)
+    neg = np.zeros(V.shape[1])
+    for a in minus: neg = neg + (np.abs(row(a)) if rule.get("abs_minus") else row(a))
+    val = val - neg
+
+    cond = rule.get("if")
+    terms = np.array([row(a) for a in rule_terms(rule)])
+    if cond is None: ok = np.ones(V.shape[1], dtype=bool)
+    elif cond == "lead": ok = row(plus[0]) != 0
+    elif cond == "any": ok = (terms != 0).any(axis=0)
+    elif cond == "all": ok = (terms != 0).all(axis=0)
+    elif cond == "result": ok = val != 0
+    else: ok = np.array([row(a) != 0 for a in cond]).all(axis=0)
+    return val, ok
+
+def evaluate_rules(table_type, V, accounts):
+    # 批量执行规则表：V 为 (科目 × 列) 矩阵，就地写入推算值；返回推算掩码、各校验残差与穿透汇总
+    idx = {k: i for i, k in enumerate(accounts)}
+    derived = np.zeros(V.shape, dtype=bool)
+    checks, drills = [], []
+    for rule in RECON_RULES[table_type]:
+        # 推算/穿透的目标科目已不在字典里时整条跳过
+        if rule["type"] in ("derive", "drill") and rule["target"] not in idx: continue
+        if rule["type"] == "derive":
+            val, ok = eval_rule(rule, V, idx)
+            t = idx[rule["target"]]
+            hit = ok & (V[t] == 0)
+            if hit.any():
+                V[t, hit] = [round(x, 2) for x in val[hit].tolist()]
+                derived[t, hit] = True
+        if rule["type"] == "check":
+            val, ok = eval_rule(rule, V, idx)
+            residual = np.array([round(x, 2) for x in val.tolist()])
+            checks.append({"rule": rule, "residual": residual, "failed": ok & (np.abs(residual) > 0.01)})
+        if rule["type"] == "drill" or rule.get("drill"):
+            subs = np.zeros(V.shape[1])
+            for a in rule["plus"]: subs = subs + rule_row(V, idx, a)
+            drills.append({"rule": rule, "main": V[idx[rule["target"]]].copy(), "subs": subs})
+    return derived, checks, drills
+
+def reconcile_batch(hits_list, table_type="BS"):
+    # 多文件批量勾稽：所有文件的有效列拼成一个矩阵，每条规则只执行一次
+    is_bs = table_type == "BS"
+    accounts = list(BS_STANDARD_MAP if is_bs else PL_STANDARD_MAP)
+    c1_name, c2_name = PERIOD_NAMES[table_type]["P1"], PERIOD_NAMES[table_type]["P2"]
+
+    files, columns = [], []
+    for hits in hits_list:
+        rows = {}
+        for k in accounts:
+            v_1, v_2 = hits[(k, "P1")][2], hits[(k, "P2")][2]
+            if v_1 != 0 or v_2 != 0: rows[k] = {c1_name: v_1, c2_name: v_2}
+        
+        active_cols = [c1_name, c2_name]
+        if rows:
+            if all(r[c2_name] == 0 for r in rows.values()):
+                active_cols = [c1_name]
+                hits = {k: v for k, v in hits.items() if k[1] != "P2"}
+            elif all(r[c1_name] == 0 for r in rows.values()):
+                active_cols = [c2_name]
+                hits = {k: v for k, v in hits.items() if k[1] != "P1"}
+        # 没有任何科目的文件不参与推算与校验
+        cols = active_cols if rows else []
+        files.append({"hits": hits, "active_cols": active_cols, "present": set(rows), "cols": list(range(len(columns), len(columns) + len(cols)))})
+        columns += [(rows, c) for c in cols]
+
+    V = np.array([[rows[k][c] if k in rows else 0.0 for rows, c in columns] for k in accounts]).reshape(len(accounts), len(columns))
+    derived, checks, drills = evaluate_rules(table_type, V, accounts)
+
+    pos, results = {k: i for i, k in enumerate(accounts)}, []
+    for f in files:
+        hits, cols = f["hits"], f["cols"]
+        present = [k for i, k in enumerate(accounts) if k in f["present"] or derived[i, cols].any()]
+        values = {c: {k: float(V[pos[k], j]) for k in present} for c, j in zip(f["active_cols"], cols)}
+        err_msg, err_coords, check_rows = [], [], []
+        for c, j in zip(f["active_cols"], cols):
+            p_id = "P1" if c == c1_name else "P2"
+            for chk in checks:
+                rule = chk["rule"]
+                cells = [(hits[(n, p_id)][0], hits[(n, p_id)][1]) for n in rule_terms(rule) if (n, p_id) in hits and hits[(n, p_id)][0] != -1]
+                failed = bool(chk["failed"][j])
+                check_rows.append({"col": c, "name": rule["name"], "terms": rule_terms(rule), "residual": float(chk["residual"][j]), "failed": failed, "cells": cells})
+                if failed:
+                    err_msg.append(f"【{c}】{rule['name']}")
+                    err_coords += cells
+        results.append({
+            "df_clean": pd.DataFrame([{"标准科目": k, **{c: values[c][k] for c in f["active_cols"]}} for k in present]),
+            "values": values, "hits": hits, "active_cols": f["active_cols"],
+            "err_msg": err_msg, "err_coords": err_coords, "checks": check_rows,
+            "drills": {c: [(d["rule"]["target"], float(d["main"][j]), float(d["subs"][j])) for d in drills] for c, j in zip(f["active_cols"], cols)},
+            "derived": {c: [k for i, k in enumerate(accounts) if derived[i, j]] for c, j in zip(f["active_cols"], cols)},
+        })
+    return results
+
+def reconcile_statement(hits, table_type="BS"):
+    # 提取结果 → 标准化清单 + 二次计算 + 勾稽校验 (与界面完全同一套逻辑)
+    return reconcile_batch([hits], table_type)[0]
+
+def run_statements(file, table_types=STATEMENT_TYPES, cache=None, pdf_workers=None, locate_pages=True, layouts=None):
+    # 无界面的完整流程：载入 → 提取 → 净额/合计推算 → 勾稽；一次解析同时出 BS 与 PL，Streamlit 与批处理共用
+    extracted = extract_statements(file, table_types, cache, pdf_workers, locate_pages, layouts)
+    with stage("勾稽"):
+        return {t: {"raw": raw, "sheet": sheet, "source": source, **reconcile_statement(hits, t)} for t, (raw, sheet, hits, source) in extracted.items()}
+
+def run_pipeline(file, table_type="BS", cache=None, pdf_workers=None, locate_pages=True, layouts=None):
+    return run_statements(file, [table_type], cache, pdf_workers, locate_pages, layouts)[table_type]
@@ -0,0 +1,67 @@
+import io
+from fred_core import PERIOD_NAMES
+
+# ==========================================
+# 标准化结果导出：openpyxl write_only 逐行落盘，多张表 (标准化数值 / 取数来源 / 勾稽残差)
+# 批处理可把任意多个文件陆续追加进同一个工作簿，内存占用与文件数无关；openpyxl 到真正写工作簿时才导入
+# ==========================================
+STATEMENT_SHEETS = {"BS": "资产负债表", "PL": "利润表"}
+SOURCE_SHEET, SOURCE_HEADER = "取数来源", ["文件", "报表", "标准科目", "期间", "金额", "来源", "行", "列", "单元格"]
+CHECK_SHEET, CHECK_HEADER = "勾稽校验", ["文件", "报表", "期间", "校验规则", "残差", "结果", "涉及科目", "涉及单元格"]
+
+def export_payload(result):
+    # 导出只用到这些字段；批处理子进程回传时不带原始表与归一化表
+    return {k: result[k] for k in ["df_clean", "hits", "checks", "derived", "active_cols"]}
+
+def cell_ref(r, c):
+    # 0 起行列号 → "C12"；与 openpyxl 的列字母规则一致，只为拼坐标不必导入 openpyxl
+    col, n = "", c + 1
+    while n: n, rem = divmod(n - 1, 26); col = chr(65 + rem) + col
+    return f"{col}{r + 1}"
+
+class ExportWriter:
+    def __init__(self, target):
+        from openpyxl import Workbook
+        self.target, self.wb, self.sheets = target, Workbook(write_only=True), {}
+        for t in STATEMENT_SHEETS: self.sheet(STATEMENT_SHEETS[t], ["文件", "标准科目", PERIOD_NAMES[t]["P1"], PERIOD_NAMES[t]["P2"]])
+        self.sheet(SOURCE_SHEET, SOURCE_HEADER)
+        self.sheet(CHECK_SHEET, CHECK_HEADER)
+
+    def sheet(self, name, header=None):
+        if name not in self.sheets:
+            self.sheets[name] = self.wb.create_sheet(name)
+            self.sheets[name].append(header)
+        return self.sheets[name]
+
+    def add(self, file, table_type, result):
+        statement, p_names = STATEMENT_SHEETS[table_type], PERIOD_NAMES[table_type]
+        p_ids = {name: p for p, name in p_names.items()}
+        hits, derived = result["hits"], result["derived"]
+
+        for rec in result["df_clean"].to_dict('records'):
+            k = rec["标准科目"]
+            self.sheet(statement).append([file, k, rec.get(p_names["P1"]), rec.get(p_names["P2"])])
+            for col in result["active_cols"]:
+                r, c, v = hits.get((k, p_ids[col]), (-1, -1, 0.0))
+                if r != -1: src = ["提取", r + 1, c + 1, cell_ref(r, c)]
+                else: src = ["推算" if k in derived.get(col, []) else "", None, None, None]
+                self.sheet(SOURCE_SHEET).append([file, statement, k, col, rec[col]] + src)
+
+        for chk in result["checks"]:
+            self.sheet(CHECK_SHEET).append([file, statement, chk["col"], chk["name"], round(chk["residual"], 2), "失衡" if chk["failed"] else "通过",
+                                            "、".join(chk["terms"]), ", ".join(cell_ref(r, c) for r, c in chk["cells"])])
+
+    def close(self):
+        self.wb.save(self.target)
+        return self.target
+
+def write_export(target, items):
+    # items: [(文件名, 报表类型, 结果)]；target 为路径或可写的二进制文件对象
+    writer = ExportWriter(target)
+    for name, table_type, result in items: writer.add(name, table_type, result)
+    return writer.close()
+
+def export_bytes(items):
+    out = io.BytesIO()
+    write_export(out, items)
+    return out.getvalue()
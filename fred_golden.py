@@ -0,0 +1,237 @@
+import io
+import os
+import sys
+import json
+import time
+import tarfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+import pandas as pd
+
+# ==========================================
+# 金标准回归：python fred_golden.py 语料目录/ -e git:HEAD~1,current [-r 3] [-o 报告目录]
+#   语料里每个样本旁放一份 <样本文件名>.expected.json：{"BS": {"货币资金": {"期初余额": 1.0, "期末余额": 2.0}, ...}, "PL": {...}}
+#   --bless 用第一个引擎的结果给还没有期望值的样本生成初稿 (人工核对后再入库)
+# 引擎：current (本目录 fred_core)、v1.4 (原 v1.4.py，只有资产负债表)、git:<提交> 或任意含 fred_core 的目录
+# 每个引擎在独立子进程里跑，互不串模块，计时也不受对方缓存与导入影响
+# ==========================================
+HERE = os.path.dirname(os.path.abspath(__file__))
+EXPECTED_SUFFIX = ".expected.json"
+TOLERANCE = 0.01
+LINE_MARK = "@@golden "
+
+# ==========================================
+# 1. 子进程：载入指定版本的引擎，逐文件输出标准化结果与耗时
+# ==========================================
+def frame_values(df):
+    return {rec["标准科目"]: {c: float(v) for c, v in rec.items() if c != "标准科目"} for rec in df.to_dict('records')}
+
+def run_core(fc, path, table_types):
+    # 较早的版本只有 run_pipeline (一次一张表)，run_statements 一次出全部
+    if hasattr(fc, "run_statements"): results = fc.run_statements(path, table_types)
+    else: results = {t: fc.run_pipeline(path, t) for t in table_types}
+    return {t: {"values": frame_values(r["df_clean"]), "passed": not r["err_msg"]} for t, r in results.items()}
+
+def run_legacy(legacy, named, path, table_types):
+    if "BS" not in table_types: return {}
+    raw = legacy["load_file"](named(path))
+    rows = []
+    for k in legacy["STANDARD_MAP"]:
+        v_pre, v_cur = legacy["grid_search"](raw, k, "期初")[0], legacy["grid_search"](raw, k, "期末")[0]
+        if v_pre != 0 or v_cur != 0: rows.append({"标准科目": k, "期初余额": v_pre, "期末余额": v_cur})
+    df_clean = pd.DataFrame(rows, columns=["标准科目", "期初余额", "期末余额"]).fillna(0.0)
+    for p in ['期初', '期末']: legacy["calculate_net_and_totals"](df_clean, p)
+    # v1.4 的勾稽写在界面代码里，无法单独执行
+    return {"BS": {"values": frame_values(df_clean), "passed": None}}
+
+def worker(kind, location, files, table_types, repeat):
+    if kind == "legacy":
+        from fred_bench import load_legacy_engine, _Named
+        legacy = load_legacy_engine(location)
+        run = lambda path: run_legacy(legacy, _Named, path, table_types)
+    else:
+        sys.path.insert(0, location)
+        import fred_core
+        run = lambda path: run_core(fred_core, path, table_types)
+    for path in files:
+        times, out = [], None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            try:
+                out = {"statements": run(path)}
+            except Exception as e:
+                out = {"error": f"{type(e).__name__}: {e}"}
+            times.append(time.perf_counter() - t0)
+        print(LINE_MARK + json.dumps({"file": path, "elapsed": statistics.median(times), **out}, ensure_ascii=False), flush=True)
+
+# ==========================================
+# 2. 主进程：准备引擎、收集结果、打分对比
+# ==========================================
+def prepare_engine(spec, tmp_root):
+    # 返回 (类型, 位置)；git:<提交> 用 git archive 导出到临时目录
+    if spec == "v1.4": return "legacy", os.path.join(HERE, "v1.4.py")
+    if spec == "current": return "core", HERE
+    if spec.startswith("git:"):
+        target = os.path.join(tmp_root, spec[4:].replace("/", "_").replace("~", "-").replace("^", "-"))
+        tar = subprocess.run(["git", "archive", "--format=tar", spec[4:]], cwd=HERE, capture_output=True)
+        if tar.returncode: raise ValueError(f"无法导出 {spec}：{tar.stderr.decode('utf-8', 'replace').strip()}")
+        with tarfile.open(fileobj=io.BytesIO(tar.stdout)) as tf: tf.extractall(target)
+        location = target
+    elif os.path.isdir(spec):
+        location = os.path.abspath(spec)
+    else:
+        raise ValueError(f"未知引擎 {spec}：可用 current / v1.4 / git:<提交> / 目录")
+    if not os.path.exists(os.path.join(location, "fred_core.py")): raise ValueError(f"{spec} 里没有 fred_core.py (早于引擎拆分的版本无法单独运行)")
+    return "core", location
+
+def run_engine(kind, location, files, table_types, repeat):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", kind, location, "-t", ",".join(table_types), "-r", str(repeat), "--"] + files
+    proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', env={**os.environ, "PYTHONIOENCODING": "utf-8"})
+    records = {}
+    for line in proc.stdout.splitlines():
+        if line.startswith(LINE_MARK):
+            rec = json.loads(line[len(LINE_MARK):])
+            records[rec["file"]] = rec
+    if proc.returncode and not records: raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"子进程退出码 {proc.returncode}")
+    return records
+
+def load_expected(path):
+    with open(path + EXPECTED_SUFFIX, encoding='utf-8') as f: return json.load(f)
+
+def score_statement(expected, actual):
+    # 期望与实际的科目/期间取并集逐格比较，缺失按 0 计；多出来的非零科目同样算错
+    cells = []
+    for k in dict.fromkeys(list(expected) + list(actual)):
+        e, a = expected.get(k, {}), actual.get(k, {})
+        for col in dict.fromkeys(list(e) + list(a)):
+            ev, av = e.get(col, 0.0), a.get(col, 0.0)
+            if ev == 0 and av == 0: continue
+            cells.append((k, col, ev, av, abs(ev - av) <= TOLERANCE))
+    return cells
+
+def evaluate(files, engines, runs, table_types):
+    # 返回 (逐文件表, 逐科目表)
+    file_rows, account_rows = [], {}
+    for path in files:
+        expected = load_expected(path)
+        for label in engines:
+            rec = runs[label].get(path, {"error": "没有结果", "elapsed": None})
+            row = {"文件": path, "引擎": label, "耗时(秒)": round(rec["elapsed"], 4) if rec.get("elapsed") is not None else None, "格数": 0, "正确": 0, "勾稽通过": None, "说明": rec.get("error", "")}
+            passed = []
+            for t in table_types:
+                if t not in expected: continue
+                st = (rec.get("statements") or {}).get(t)
+                if st is None: continue
+                if st["passed"] is not None: passed.append(st["passed"])
+                for k, col, ev, av, ok in score_statement(expected[t], st["values"]):
+                    row["格数"] += 1
+                    row["正确"] += ok
+                    acc = account_rows.setdefault((t, k, label), {"报表类型": t, "标准科目": k, "引擎": label, "格数": 0, "正确": 0, "错例": []})
+                    acc["格数"] += 1
+                    acc["正确"] += ok
+                    if not ok and len(acc["错例"]) < 3: acc["错例"].append(f"{os.path.basename(path)} {col}: 期望 {ev:,.2f} 实得 {av:,.2f}")
+            row["准确率"] = row["正确"] / row["格数"] if row["格数"] else None
+            row["勾稽通过"] = all(passed) if passed else None
+            file_rows.append(row)
+    accounts = [{**a, "准确率": a["正确"] / a["格数"], "错例": "；".join(a["错例"])} for a in account_rows.values()]
+    return pd.DataFrame(file_rows), pd.DataFrame(accounts)
+
+def summary(files_df, engines):
+    rows = []
+    for label in engines:
+        d = files_df[files_df["引擎"] == label]
+        checked = d["勾稽通过"].dropna()
+        rows.append({"引擎": label, "文件数": len(d), "失败": int((d["说明"] != "").sum()), "科目准确率": d["正确"].sum() / max(d["格数"].sum(), 1),
+                     "勾稽通过率": checked.astype(bool).mean() if len(checked) else None,
+                     "总耗时(秒)": d["耗时(秒)"].sum(), "单文件中位(秒)": d["耗时(秒)"].median()})
+    return pd.DataFrame(rows)
+
+def regressions(files_df, engines, slowdown, min_delta):
+    # 以第一个引擎为基线：准确率下降、勾稽由通过变失衡、或耗时超过基线 slowdown 倍 (且多出 min_delta 秒以上)
+    base = files_df[files_df["引擎"] == engines[0]].set_index("文件")
+    found = []
+    for label in engines[1:]:
+        for _, r in files_df[files_df["引擎"] == label].iterrows():
+            b = base.loc[r["文件"]]
+            if pd.notna(r["准确率"]) and pd.notna(b["准确率"]) and r["准确率"] < b["准确率"]:
+                found.append(f"[{label}] 准确率下降 {b['准确率']:.1%} → {r['准确率']:.1%}  {r['文件']}")
+            if pd.notna(b["勾稽通过"]) and pd.notna(r["勾稽通过"]) and b["勾稽通过"] and not r["勾稽通过"]:
+                found.append(f"[{label}] 勾稽由通过变为失衡  {r['文件']}")
+            if r["耗时(秒)"] and b["耗时(秒)"] and r["耗时(秒)"] > b["耗时(秒)"] * slowdown and r["耗时(秒)"] - b["耗时(秒)"] > min_delta:
+                found.append(f"[{label}] 变慢 {b['耗时(秒)']:.3f}s → {r['耗时(秒)']:.3f}s  {r['文件']}")
+    return found
+
+def bless(files, records):
+    written = 0
+    for path in files:
+        rec = records.get(path, {})
+        if os.path.exists(path + EXPECTED_SUFFIX) or "statements" not in rec: continue
+        with open(path + EXPECTED_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump({t: st["values"] for t, st in rec["statements"].items()}, f, ensure_ascii=False, indent=1)
+        written += 1
+    return written
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fred ETL 金标准回归：逐科目准确率、勾稽通过率、逐文件耗时，多个引擎版本并排对比")
+    ap.add_argument("inputs", nargs="*", help="语料文件、目录或通配符")
+    ap.add_argument("-e", "--engines", default="current", help="引擎，逗号分隔，第一个为基线 (如 git:HEAD~1,current 或 v1.4,current)")
+    ap.add_argument("-t", "--table-types", default="BS,PL", help="参与打分的报表类型 (默认 BS,PL)")
+    ap.add_argument("-r", "--repeat", type=int, default=1, help="每个文件重复次数，耗时取中位数 (默认 1)")
+    ap.add_argument("-o", "--out", default="fred_golden_report", help="报告目录 (默认 fred_golden_report)")
+    ap.add_argument("--slowdown", type=float, default=1.5, help="单文件耗时超过基线多少倍记为变慢 (默认 1.5)")
+    ap.add_argument("--min-delta", type=float, default=0.05, help="变慢还须多出的秒数，过滤计时抖动 (默认 0.05)")
+    ap.add_argument("--bless", action="store_true", help="用第一个引擎的结果为还没有期望值的样本生成 .expected.json")
+    ap.add_argument("--worker", nargs=2, metavar=("KIND", "LOCATION"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    table_types = args.table_types.split(",")
+
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.inputs, table_types, args.repeat)
+        return 0
+
+    from fred_batch import collect_inputs
+    files = [os.path.abspath(f) for f in collect_inputs(args.inputs)]
+    if not files:
+        print("没有找到可处理的文件 (.xlsx/.xls/.pdf/.csv)", file=sys.stderr)
+        return 2
+    engines = list(dict.fromkeys(args.engines.split(",")))
+
+    runs = {}
+    with tempfile.TemporaryDirectory(prefix="fred_golden_") as tmp_root:
+        for i, spec in enumerate(engines):
+            try:
+                kind, location = prepare_engine(spec, tmp_root)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                return 2
+            todo = files if args.bless and i == 0 else [f for f in files if os.path.exists(f + EXPECTED_SUFFIX)]
+            t0 = time.perf_counter()
+            runs[spec] = run_engine(kind, location, todo, table_types, args.repeat)
+            print(f"{spec}: {len(runs[spec])} 个文件，用时 {time.perf_counter() - t0:.1f}s (含进程启动)", flush=True)
+            if args.bless and i == 0: print(f"已为 {bless(files, runs[spec])} 个样本生成期望值初稿，请人工核对")
+
+    files = [f for f in files if os.path.exists(f + EXPECTED_SUFFIX)]
+    if not files:
+        print("语料里没有 .expected.json 期望值；可先加 --bless 生成初稿", file=sys.stderr)
+        return 2
+    files_df, accounts_df = evaluate(files, engines, runs, table_types)
+
+    os.makedirs(args.out, exist_ok=True)
+    files_df.to_csv(os.path.join(args.out, "files.csv"), index=False, encoding='utf-8-sig')
+    accounts_df.to_csv(os.path.join(args.out, "accounts.csv"), index=False, encoding='utf-8-sig')
+
+    pd.set_option("display.width", 200)
+    print("\n" + summary(files_df, engines).round(4).to_string(index=False))
+    if not accounts_df.empty:
+        pivot = accounts_df.pivot_table(index=["报表类型", "标准科目"], columns="引擎", values="准确率", sort=False).reindex(columns=engines)
+        worst = pivot[(pivot < 1).any(axis=1)].sort_values(engines[-1])
+        if not worst.empty: print(f"\n未全对的科目 ({len(worst)} 个，完整明细见 accounts.csv):\n" + worst.round(3).head(30).to_string())
+    found = regressions(files_df, engines, args.slowdown, args.min_delta)
+    for line in found: print(line)
+    print(f"\n{len(files)} 个样本，{len(engines)} 个引擎；回归 {len(found)} 处。报告见 {args.out}")
+    return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import io
+import os
+import time
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from fred_core import BS_STANDARD_MAP, PL_STANDARD_MAP, PERIOD_NAMES, STATEMENT_TYPES, run_statements, profiling, watching
+
+# ==========================================
+# 界面后台任务：上传即提交到线程池，解析不再阻塞会话；界面按快照轮询逐页进度与已解出的科目
+# 同时解析的文件数 FRED_UI_JOBS (默认 2)；PDF 页段并行仍由每个任务自己的进程池负责
+# ==========================================
+JOB_WORKERS = int(os.environ.get("FRED_UI_JOBS", 0)) or 2
+ACCOUNT_TOTALS = {"BS": len(BS_STANDARD_MAP), "PL": len(PL_STANDARD_MAP)}
+RUNNING = ("排队中", "解析中")
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="fred-job")
+
+    def submit(self, name, data, cache=None, pdf_workers=None, locate_pages=True):
+        # 上传对象会随下一次重跑失效，先复制成独立的内存文件
+        up = io.BytesIO(data)
+        up.name = name
+        job = {"name": name, "file": up, "status": "排队中", "phase": "", "done": 0, "total": 0, "hits": {},
+               "result": None, "error": None, "prof": None, "elapsed": None, "lock": threading.Lock()}
+        self.pool.submit(run_job, job, cache, pdf_workers, locate_pages)
+        return job
+
+def run_job(job, cache=None, pdf_workers=None, locate_pages=True):
+    def on_progress(event, **info):
+        with job["lock"]:
+            if event == "pages":
+                job.update(phase=info["phase"], done=info["done"], total=info["total"])
+            elif event == "account":
+                job["hits"].setdefault(info["table_type"], {}).update(info["hits"])
+            elif event == "statement":
+                job["hits"][info["table_type"]] = dict(info["hits"])
+
+    t0 = time.perf_counter()
+    with job["lock"]: job["status"] = "解析中"
+    try:
+        with profiling() as prof, watching(on_progress):
+            result = run_statements(job["file"], cache=cache, pdf_workers=pdf_workers, locate_pages=locate_pages)
+    except Exception as e:
+        with job["lock"]: job.update(status="失败", error=e, elapsed=time.perf_counter() - t0)
+    else:
+        with job["lock"]: job.update(status="完成", result=result, prof=prof, elapsed=time.perf_counter() - t0)
+
+def snapshot(job):
+    # 后台线程仍在写，界面只读锁内拷贝出来的一份
+    with job["lock"]:
+        return {**job, "hits": {t: dict(h) for t, h in job["hits"].items()}}
+
+def job_progress(snap):
+    # (进度比例, 说明)：先按页 (PDF)，载入完成后按已提取的科目数
+    if snap["status"] == "完成": return 1.0, f"完成，用时 {snap['elapsed']:.1f}s"
+    if snap["status"] == "失败": return 1.0, f"失败：{snap['error']}"
+    if snap["status"] == "排队中": return 0.0, "排队中…"
+    if snap["hits"]:
+        done = sum(len({k for k, p in h}) for h in snap["hits"].values())
+        total = sum(ACCOUNT_TOTALS[t] for t in STATEMENT_TYPES)
+        return min(done / total, 1.0), f"提取科目 {done}/{total}"
+    if snap["total"]: return snap["done"] / snap["total"], f"{snap['phase']} {snap['done']}/{snap['total']} 页"
+    return 0.0, "载入文件…"
+
+def partial_frame(hits, table_type):
+    # 已解出的科目 (找到取数格的) 先行展示；净额/合计推算与勾稽要等整张表完成
+    p_names = PERIOD_NAMES[table_type]
+    rows = {}
+    for (k, p), (r, c, v) in hits.items():
+        if r != -1: rows.setdefault(k, {"标准科目": k, p_names["P1"]: None, p_names["P2"]: None})[p_names[p]] = v
+    return pd.DataFrame(list(rows.values()), columns=["标准科目", p_names["P1"], p_names["P2"]])
@@ -0,0 +1,195 @@
+import re
+import sys
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from fred_core import BS_STANDARD_MAP, PL_STANDARD_MAP, PERIOD_NAMES, STATEMENT_TYPES, clean_num_frame, reconcile_statement
+
+# ==========================================
+# 原版对照：python fred_parity.py [-n 300] [--seed 0]
+#   clean_num_frame 与原逐格 clean_num、reconcile_statement 与原 V1.3.3 逐列推算/勾稽，在随机数据上逐项比对
+# 下面是原版代码的副本 (逻辑照抄，只把界面里的局部变量改成参数、重复的补行写法收成 put)，作为对照基准，不要跟着引擎改
+# ==========================================
+def baseline_clean_num(text):
+    if pd.isna(text): return 0.0
+    t = re.sub(r'[^0-9.\-()]', '', str(text))
+    if t.startswith('(') and t.endswith(')'): t = '-' + t[1:-1]
+    match = re.search(r'-?\d+\.\d{1,4}|-?\d{4,}', t)
+    if match:
+        try:
+            val = float(match.group())
+            if val != 0 and val.is_integer() and 1 <= abs(val) <= 400: return None
+            return round(val, 2)
+        except: return 0.0
+    return 0.0 if t in ['-', '0', ''] else None
+
+def calculate_net_and_totals_bs(df_clean, col_key, c1_name, c2_name):
+    if df_clean.empty: return
+
+    def v(n):
+        res_val = df_clean.loc[df_clean['标准科目']==n, col_key]
+        return res_val.values[0] if not res_val.empty else 0.0
+
+    def put(k, val):
+        if k in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == k, col_key] = val
+        else:
+            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = [k, val if col_key == c1_name else 0.0, val if col_key == c2_name else 0.0]
+            else: df_clean.loc[len(df_clean)] = [k, val]
+
+    def calc_net(gross_key, contra_keys, net_key):
+        gross_val = v(gross_key)
+        contra_val = sum([abs(v(k)) for k in contra_keys])
+        if v(net_key) == 0 and gross_val != 0: put(net_key, round(gross_val - contra_val, 2))
+
+    calc_net("固定资产", ["累计折旧", "固定资产减值准备"], "固定资产净额")
+    calc_net("无形资产", ["累计摊销", "无形资产减值准备"], "无形资产净额")
+    calc_net("存货", ["存货跌价准备"], "存货净额")
+    calc_net("应收账款", ["坏账准备"], "应收账款净额")
+    calc_net("长期股权投资", ["长期股权投资减值准备"], "长期股权投资净额")
+
+    a_curr, a_non = v('流动资产合计'), v('非流动资产合计')
+    if v('资产总计') == 0 and (a_curr != 0 or a_non != 0): put('资产总计', round(a_curr + a_non, 2))
+    l_curr, l_non = v('流动负债合计'), v('非流动负债合计')
+    if v('负债合计') == 0 and (l_curr != 0 or l_non != 0): put('负债合计', round(l_curr + l_non, 2))
+
+    a_total, l_total, e_total = v('资产总计'), v('负债合计'), v('所有者权益合计')
+    if a_total == 0 and l_total != 0 and e_total != 0: put('资产总计', round(l_total + e_total, 2))
+    elif l_total == 0 and a_total != 0 and e_total != 0: put('负债合计', round(a_total - e_total, 2))
+    elif e_total == 0 and a_total != 0 and l_total != 0: put('所有者权益合计', round(a_total - l_total, 2))
+
+def baseline_reconcile(hits, table_type):
+    is_bs = table_type == "BS"
+    current_map = BS_STANDARD_MAP if is_bs else PL_STANDARD_MAP
+    c1_name, c2_name = PERIOD_NAMES[table_type]["P1"], PERIOD_NAMES[table_type]["P2"]
+    res = []
+    for k in current_map:
+        v_1, v_2 = hits[(k, "P1")][2], hits[(k, "P2")][2]
+        if v_1 != 0 or v_2 != 0: res.append({"标准科目": k, c1_name: v_1, c2_name: v_2})
+    df_clean = pd.DataFrame(res)
+    if not df_clean.empty:
+        df_clean[c1_name] = pd.to_numeric(df_clean[c1_name], errors='coerce').fillna(0.0)
+        df_clean[c2_name] = pd.to_numeric(df_clean[c2_name], errors='coerce').fillna(0.0)
+
+    active_cols = [c1_name, c2_name]
+    if not df_clean.empty:
+        if c2_name in df_clean.columns and (df_clean[c2_name] == 0).all():
+            df_clean = df_clean.drop(columns=[c2_name])
+            active_cols = [c1_name]
+            hits = {k: v for k, v in hits.items() if k[1] != "P2"}
+        elif c1_name in df_clean.columns and (df_clean[c1_name] == 0).all():
+            df_clean = df_clean.drop(columns=[c1_name])
+            active_cols = [c2_name]
+            hits = {k: v for k, v in hits.items() if k[1] != "P1"}
+
+    err_msg, err_coords = [], []
+    if not df_clean.empty:
+        for col_key in active_cols:
+            p_id = "P1" if col_key == c1_name else "P2"
+            def v(k):
+                match = df_clean.loc[df_clean['标准科目'] == k, col_key]
+                return match.values[0] if not match.empty else 0.0
+            if is_bs:
+                calculate_net_and_totals_bs(df_clean, col_key, c1_name, c2_name)
+                if abs(round(v('资产总计') - (v('负债合计') + v('所有者权益合计')), 2)) > 0.01:
+                    err_msg.append(f"【{col_key}】资产负债表失衡")
+                    terms = ['资产总计', '负债合计', '所有者权益合计']
+                else: terms = []
+            else:
+                def update_or_add_pl(k, val):
+                    if k in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == k, col_key] = val
+                    else:
+                        if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = [k, val if col_key == c1_name else 0.0, val if col_key == c2_name else 0.0]
+                        else: df_clean.loc[len(df_clean)] = [k, val]
+                if v("营业收入") == 0:
+                    sub_rev = v("主营业务收入") + v("其他业务收入")
+                    if sub_rev != 0: update_or_add_pl("营业收入", round(sub_rev, 2))
+                if v("营业成本") == 0:
+                    sub_cost = v("主营业务成本") + v("其他业务成本")
+                    if sub_cost != 0: update_or_add_pl("营业成本", round(sub_cost, 2))
+                if v("税金及附加") == 0:
+                    tax_sum = sum(v(t) for t in ["消费税", "营业税", "城市维护建设税", "资源税", "教育费附加", "城镇土地使用税", "房产税", "车船税", "印花税"])
+                    if tax_sum != 0: update_or_add_pl("税金及附加", round(tax_sum, 2))
+                tot_profit, tax_exp, net_profit = v("利润总额"), v("所得税费用"), v("净利润")
+                terms = []
+                if tot_profit != 0 and net_profit != 0 and abs(round(tot_profit - tax_exp - net_profit, 2)) > 0.01:
+                    err_msg.append(f"【{col_key}】存在差异(利润总额-所得税与净利润不符)")
+                    terms = ['利润总额', '所得税费用', '净利润']
+            for n in terms:
+                if (n, p_id) in hits and hits[(n, p_id)][0] != -1: err_coords.append((hits[(n, p_id)][0], hits[(n, p_id)][1]))
+
+        order = list(current_map.keys())
+        df_clean['_sort'] = df_clean['标准科目'].apply(lambda x: order.index(x) if x in order else 999)
+        df_clean = df_clean.sort_values('_sort').drop('_sort', axis=1).reset_index(drop=True)
+    return {"df_clean": df_clean, "err_msg": err_msg, "err_coords": err_coords, "active_cols": active_cols}
+
+# ==========================================
+# 随机数据
+# ==========================================
+CELL_WORDS = ["货币资金", "附注五、1", "其中：", "减：累计折旧", "单位：元", "2024年12月31日", "本期金额", "-", "—", "", "0", "nan", "N/A"]
+
+def random_cell(rnd):
+    kind = rnd.random()
+    if kind < 0.1: return None
+    if kind < 0.2: return rnd.choice(CELL_WORDS)
+    if kind < 0.3: return rnd.choice([rnd.randint(-500, 500), float(rnd.randint(-500, 500)), f"{rnd.randint(-500, 500)}.{'0' * rnd.randint(1, 2)}"])
+    if kind < 0.4: return round(rnd.uniform(-1e7, 1e7), rnd.randint(0, 3))
+    x = round(rnd.uniform(-1e8, 1e8), rnd.randint(0, 6))
+    s = f"{abs(x):,.{rnd.randint(0, 6)}f}" if rnd.random() < 0.5 else str(abs(x))
+    if x < 0: s = f"({s})" if rnd.random() < 0.5 else "-" + s
+    if rnd.random() < 0.1: s = rnd.choice(CELL_WORDS) + s
+    if rnd.random() < 0.1: s = s + rnd.choice([" ", "元", "%", "\n"])
+    return s
+
+def check_clean_num(rnd, n_cells):
+    cells = [random_cell(rnd) for _ in range(n_cells)]
+    num, not_num = clean_num_frame(pd.DataFrame(np.array(cells, dtype=object).reshape(-1, 1)))
+    bad = []
+    for x, v, nn in zip(cells, num[:, 0], not_num[:, 0]):
+        ref = baseline_clean_num(x)
+        if (ref is None) != bool(nn) or (ref is not None and ref != v): bad.append((x, ref, v, nn))
+    return bad
+
+def random_hits(rnd, table_type):
+    std_map = BS_STANDARD_MAP if table_type == "BS" else PL_STANDARD_MAP
+    # 按概率清空某一整期，覆盖单期报表与 "只剩一列" 的分支
+    drop = rnd.choice([None, None, None, "P1", "P2"])
+    hits = {}
+    for i, k in enumerate(std_map):
+        for j, p in enumerate(["P1", "P2"]):
+            if p == drop or rnd.random() < 0.4: hits[(k, p)] = (-1, -1, 0.0)
+            else: hits[(k, p)] = (i, j + 1, rnd.choice([0.0, round(rnd.uniform(-1e6, 1e7), 2), float(rnd.randint(1, 9) * 1000)]))
+    return hits
+
+def check_reconcile(rnd, table_type):
+    hits = random_hits(rnd, table_type)
+    try:
+        ref = baseline_reconcile(dict(hits), table_type)
+    except ValueError:
+        return None  # 原版在只剩第二期时补行会列数不符而报错，这种输入没有可比的基准
+    new = reconcile_statement(dict(hits), table_type)
+    same = (ref["df_clean"].equals(new["df_clean"]) or (ref["df_clean"].empty and new["df_clean"].empty)) \
+        and ref["err_msg"] == new["err_msg"] and ref["err_coords"] == new["err_coords"] and ref["active_cols"] == new["active_cols"]
+    return same
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fred ETL 原版对照：向量化清洗与规则表勾稽是否仍与原版逐格/逐列实现一致")
+    ap.add_argument("-n", "--rounds", type=int, default=300, help="随机轮数 (默认 300)")
+    ap.add_argument("--seed", type=int, default=0, help="随机种子 (默认 0)")
+    args = ap.parse_args(argv)
+    rnd = random.Random(args.seed)
+
+    bad_cells = check_clean_num(rnd, args.rounds * 100)
+    for x, ref, v, nn in bad_cells[:20]: print(f"  clean_num 不一致: {x!r} 原版 {ref!r} → 现在 {v!r} (非数字 {nn})")
+    print(f"clean_num_frame: {args.rounds * 100} 个单元格，不一致 {len(bad_cells)}")
+
+    failed = 0
+    for t in STATEMENT_TYPES:
+        outcomes = [check_reconcile(rnd, t) for _ in range(args.rounds)]
+        n_bad, n_skip = outcomes.count(False), outcomes.count(None)
+        failed += n_bad
+        print(f"reconcile_statement [{t}]: {args.rounds} 组，不一致 {n_bad}，原版报错跳过 {n_skip}")
+    return 1 if bad_cells or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# ==========================================
+# PDF 表格并行抽取 (按页段分发给进程池，每个进程自己打开文件)
+# ==========================================
+PDF_WORKERS = int(os.environ.get("FRED_PDF_WORKERS", 0)) or (os.cpu_count() or 1)
+MIN_PARALLEL_PAGES = 8
+
+def extract_pages(path, page_ids):
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [(i, [t for t in pdf.pages[i].extract_tables() if t]) for i in page_ids]
+
+def split_pages(page_ids, n_chunks):
+    # 连续切段，保证结果按段序拼接即为原页序
+    step = max(1, -(-len(page_ids) // n_chunks))
+    return [page_ids[s:s + step] for s in range(0, len(page_ids), step)]
+
+def page_texts(pdf, progress=None):
+    # 只取文字层，不做表格识别；逐页释放缓存，避免长报告常驻内存
+    texts = []
+    for p in pdf.pages:
+        texts.append(getattr(p, "extract_text_simple", p.extract_text)() or "")
+        if hasattr(p, "close"): p.close()
+        if progress: progress("定位报表页", len(texts), len(pdf.pages))
+    return texts
+
+def extract_pdf_page_tables(file, workers=None, page_filter=None, progress=None):
+    # 按页序返回 [(页号, 该页非空表格)]；page_filter(各页文字) 返回要抽表的页号，空结果视为不过滤
+    # workers<=1 或待抽页数较少时走原串行路径；progress(阶段, 已完成页数, 总页数) 逐页 (并行时逐段) 回报进度
+    import pdfplumber
+    workers = workers or PDF_WORKERS
+    with pdfplumber.open(file) as pdf:
+        page_ids = list(range(len(pdf.pages)))
+        if page_filter is not None:
+            page_ids = sorted(page_filter(page_texts(pdf, progress))) or page_ids
+        if workers <= 1 or len(page_ids) < MIN_PARALLEL_PAGES:
+            out = []
+            for i in page_ids:
+                out.append((i, [t for t in pdf.pages[i].extract_tables() if t]))
+                if progress: progress("抽取表格", len(out), len(page_ids))
+            return out
+
+    tmp_path = None
+    if isinstance(file, (str, os.PathLike)):
+        path = os.fspath(file)
+    else:
+        file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp: tmp.write(file.read())
+        path = tmp_path = tmp.name
+    try:
+        chunks = split_pages(page_ids, workers * 2)
+        # Streamlit 进程本身是多线程的，用 spawn 避免 fork 死锁；pool.map 按提交顺序返回，页序不乱
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=ctx) as pool:
+            out = []
+            for part in pool.map(extract_pages, [path] * len(chunks), chunks):
+                out += part
+                if progress: progress("抽取表格", len(out), len(page_ids))
+            return out
+    finally:
+        if tmp_path: os.remove(tmp_path)
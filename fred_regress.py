@@ -0,0 +1,171 @@
+import os
+import sys
+import csv
+import json
+import time
+import pickle
+import argparse
+import fred_core
+from fred_core import STATEMENT_TYPES, PERIOD_NAMES, MAP_VERSION, load_sheets, extract_statement, patch_alias_hits, reconcile_statement, profiling
+from fred_batch import collect_inputs
+from fred_export import cell_ref
+
+# ==========================================
+# 别名字典回归：改了 BS_STANDARD_MAP / PL_STANDARD_MAP 之后不必全量重跑语料
+#   python fred_regress.py snapshot 语料目录/ -s snap/   按当前字典全量跑一遍，存下归一化表、别名索引与命中
+#   python fred_regress.py check -s snap/ [--accept]     对比当前字典与快照字典，只重算受影响的科目，列出取数变化的科目
+#   python fred_regress.py check -s snap/ --verify       另对每张表按当前字典从头全量取数，核对增量结果与全量一致
+# 表/页的选择沿用快照 (归一化表不重建)；表头或报表标题改动会提示，需要时重新 snapshot
+# ==========================================
+MAPS_FILE = "maps.json"
+
+def current_maps():
+    return {"version": MAP_VERSION, "BS": fred_core.BS_STANDARD_MAP, "PL": fred_core.PL_STANDARD_MAP,
+            "BS_COL": fred_core.BS_COL_MAP, "PL_COL": fred_core.PL_COL_MAP, "TITLES": fred_core.STATEMENT_TITLES}
+
+def map_diff(old, new):
+    # {报表类型: {"changed", "added", "removed", "reordered", "shifted", "cols"}}；别名列表按 JSON 比较 (快照里存的就是 JSON)
+    new = json.loads(json.dumps(new, ensure_ascii=False))
+    out = {}
+    for t in STATEMENT_TYPES:
+        o, n = old[t], new[t]
+        d = out[t] = {"changed": [k for k in n if k in o and o[k] != n[k]], "added": [k for k in n if k not in o],
+                      "removed": [k for k in o if k not in n], "reordered": [k for k in o if k in n] != [k for k in n if k in o],
+                      "cols": old[f"{t}_COL"] != new[f"{t}_COL"]}
+        # PL 按科目顺序占用单元格：删除或调序的位置之后，每个科目都可能换格，从第一个不同的位置起全部重算
+        o_keys, n_keys = list(o), list(n)
+        i = next((i for i, (a, b) in enumerate(zip(o_keys, n_keys)) if a != b), min(len(o_keys), len(n_keys)))
+        d["shifted"] = n_keys[i:] if t == "PL" and (d["removed"] or d["reordered"]) else []
+    out["titles"] = old["TITLES"] != new["TITLES"]
+    return out
+
+def snapshot_path(snap_dir, file_key, path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(snap_dir, f"{file_key[:16]}_{stem}.pkl")
+
+def take_snapshot(files, snap_dir):
+    os.makedirs(snap_dir, exist_ok=True)
+    for i, path in enumerate(files):
+        t0 = time.perf_counter()
+        try:
+            _, file_key, parsed = load_sheets(path)
+        except Exception as e:
+            print(f"[{i + 1}/{len(files)}] 跳过 {path}：{e}", flush=True)
+            continue
+        # 只存归一化表 (含别名索引缓存) 与命中，原始 DataFrame 不入快照；BS/PL 同表时 pickle 保留共享
+        entry = {"file": path, "file_key": file_key, "sheets": {t: parsed[t][1] for t in parsed}, "hits": {}}
+        for t in parsed: entry["hits"][t] = extract_statement(parsed[t][1], t)
+        with open(snapshot_path(snap_dir, file_key, path), 'wb') as f: pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"[{i + 1}/{len(files)}] {path}  {time.perf_counter() - t0:.2f}s", flush=True)
+    with open(os.path.join(snap_dir, MAPS_FILE), 'w', encoding='utf-8') as f: json.dump(current_maps(), f, ensure_ascii=False, indent=1)
+
+def load_snapshot(snap_dir):
+    with open(os.path.join(snap_dir, MAPS_FILE), encoding='utf-8') as f: maps = json.load(f)
+    names = sorted(n for n in os.listdir(snap_dir) if n.endswith(".pkl"))
+    return maps, [os.path.join(snap_dir, n) for n in names]
+
+def rerun_entry(entry, diff, base_version):
+    # 返回 {报表类型: (新命中, 重算科目数)}；没有受影响科目的报表直接沿用快照
+    out = {}
+    for t, sheet in entry["sheets"].items():
+        d, base = diff[t], entry["hits"][t]
+        alias_changed = set(d["changed"]) | set(d["added"])
+        if not alias_changed and not d["cols"] and not d["removed"] and not d["shifted"]:
+            out[t] = (base, 0)
+            continue
+        patch_alias_hits(sheet, t, alias_changed, base_version)
+        # 表头别名变了会影响每个科目的目标列，只能整表重算 (别名索引仍是增量的)
+        accounts = None if d["cols"] else alias_changed | set(d["shifted"])
+        hits = extract_statement(sheet, t, accounts, base)
+        out[t] = (hits, len(hits) // 2 if accounts is None else len(accounts))
+    return out
+
+def compare_hits(t, old, new):
+    rows = []
+    for kp in sorted(set(old) | set(new), key=lambda kp: (kp[0], kp[1])):
+        o, n = old.get(kp, (-1, -1, 0.0)), new.get(kp, (-1, -1, 0.0))
+        if o[2] == n[2] and o[:2] == n[:2]: continue
+        rows.append({"报表类型": t, "标准科目": kp[0], "期间": PERIOD_NAMES[t][kp[1]],
+                     "旧值": o[2], "旧单元格": cell_ref(o[0], o[1]) if o[0] != -1 else "", "新值": n[2], "新单元格": cell_ref(n[0], n[1]) if n[0] != -1 else ""})
+    return rows
+
+def run_check(snap_dir, accept=False, report=None, verify=False):
+    maps, paths = load_snapshot(snap_dir)
+    diff = map_diff(maps, current_maps())
+    if maps["version"] == MAP_VERSION:
+        print("字典与快照一致，无需回归。")
+        return 0
+    for t in STATEMENT_TYPES:
+        d = diff[t]
+        print(f"{t}: 改动 {len(d['changed'])}，新增 {len(d['added'])}，删除 {len(d['removed'])}" + ("，科目顺序有改动" if d["reordered"] else "") + ("，表头别名有改动 (整表重算)" if d["cols"] else "")
+              + (f"  → {'、'.join(d['changed'] + d['added'] + d['removed'])}" if d["changed"] or d["added"] or d["removed"] else ""))
+    if diff["titles"]: print("⚠️ 报表标题有改动：表/页选择沿用快照，如需验证选表请重新 snapshot。")
+
+    t0, changes, status_changes, mismatches, n_rerun = time.perf_counter(), [], [], [], 0
+    with profiling():
+        for path in paths:
+            with open(path, 'rb') as f: entry = pickle.load(f)
+            # 全量对照要在增量之前取：别名索引缓存不带过去，整表从头扫描
+            full = {t: extract_statement({k: v for k, v in sheet.items() if k != "alias_hits"}, t) for t, sheet in entry["sheets"].items()} if verify else {}
+            new = rerun_entry(entry, diff, maps["version"])
+            mismatches += [(entry["file"], t) for t in full if full[t] != new[t][0]]
+            for t, (hits, n) in new.items():
+                n_rerun += n
+                rows = compare_hits(t, entry["hits"][t], hits)
+                for r in rows: r["文件"] = entry["file"]
+                changes += rows
+                # 勾稽很便宜，取数有变化时整表重勾稽，看失衡状态有没有跟着变 (旧结果按当前科目表补齐/剔除)
+                if rows:
+                    old = {kp: entry["hits"][t].get(kp, (-1, -1, 0.0)) for kp in hits}
+                    old_err, new_err = reconcile_statement(old, t)["err_msg"], reconcile_statement(hits, t)["err_msg"]
+                    if old_err != new_err: status_changes.append((entry["file"], t, old_err, new_err))
+            if accept:
+                entry["hits"] = {t: hits for t, (hits, n) in new.items()}
+                for sheet in entry["sheets"].values():
+                    sheet["alias_hits"] = {k: v for k, v in sheet.get("alias_hits", {}).items() if k[1] == MAP_VERSION}
+                with open(path, 'wb') as f: pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    elapsed = time.perf_counter() - t0
+
+    for r in changes:
+        print(f"  {r['文件']}  [{r['报表类型']}] {r['标准科目']} · {r['期间']}: {r['旧值']:,.2f} ({r['旧单元格'] or '-'}) → {r['新值']:,.2f} ({r['新单元格'] or '-'})")
+    for path, t, old_err, new_err in status_changes:
+        print(f"  {path}  [{t}] 勾稽: {'；'.join(old_err) or '通过'} → {'；'.join(new_err) or '通过'}")
+    for path, t in mismatches:
+        print(f"  ❌ {path}  [{t}] 增量结果与全量取数不一致")
+    if report:
+        with open(report, 'w', newline='', encoding='utf-8-sig') as f:
+            w = csv.DictWriter(f, fieldnames=["文件", "报表类型", "标准科目", "期间", "旧值", "旧单元格", "新值", "新单元格"])
+            w.writeheader()
+            w.writerows(changes)
+    print(f"\n{len(paths)} 个文件，受影响科目 {n_rerun} 个次，取数变化 {len(changes)} 处，勾稽状态变化 {len(status_changes)} 处；用时 {elapsed:.2f}s"
+          + (f"\n全量对照：不一致 {len(mismatches)} 张表" if verify else ""))
+    if accept:
+        with open(os.path.join(snap_dir, MAPS_FILE), 'w', encoding='utf-8') as f: json.dump(current_maps(), f, ensure_ascii=False, indent=1)
+        print("已把当前字典与结果写回快照。")
+    return 2 if mismatches else (1 if changes else 0)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fred ETL 别名字典增量回归")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("snapshot", help="按当前字典全量跑一遍语料并存快照")
+    sp.add_argument("inputs", nargs="+", help="文件、目录或通配符")
+    sp.add_argument("-s", "--snap", default="fred_snapshot", help="快照目录 (默认 fred_snapshot)")
+    cp = sub.add_parser("check", help="对比当前字典与快照，只重算受影响的科目")
+    cp.add_argument("-s", "--snap", default="fred_snapshot", help="快照目录 (默认 fred_snapshot)")
+    cp.add_argument("-o", "--report", default=None, help="把变化明细另存为 CSV")
+    cp.add_argument("--accept", action="store_true", help="确认变化，把当前字典与新结果写回快照")
+    cp.add_argument("--verify", action="store_true", help="另按当前字典全量取数，核对增量结果 (慢，用于验证增量回归本身)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "snapshot":
+        files = collect_inputs(args.inputs)
+        if not files:
+            print("没有找到可处理的文件 (.xlsx/.xls/.pdf/.csv)", file=sys.stderr)
+            return 2
+        take_snapshot(files, args.snap)
+        print(f"快照见 {args.snap} (字典版本 {MAP_VERSION})")
+        return 0
+    return run_check(args.snap, args.accept, args.report, args.verify)
+
+if __name__ == "__main__":
+    sys.exit(main())
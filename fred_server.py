@@ -0,0 +1,199 @@
+import os
+import io
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# 本地 HTTP 提取服务：python fred_server.py --port 8765 -j 4 --queue 16
+#   POST /extract?name=报表.xlsx&types=BS,PL  (请求体为文件原始字节) → 标准化科目 / 勾稽结果 / 取数坐标 JSON
+#   GET  /health → 进程数、排队数、忙碌数
+# 常驻子进程启动时导入一次 fred_core (别名自动机随之编译)，之后所有请求复用，解析缓存与版式库也常驻
+# 排队已满直接回 503 + Retry-After，不在内存里无限堆积上传
+# ==========================================
+SUPPORTED_EXTS = ('.xlsx', '.xls', '.pdf', '.csv')
+STATUS_CODES = {"ok": 200, "bad_request": 400, "failed": 422, "crashed": 500, "busy": 503, "timeout": 504}
+
+def result_json(name, statements, prof=None):
+    from fred_core import MAP_VERSION, PERIOD_NAMES
+    from fred_export import cell_ref
+    out = {"file": name, "map_version": MAP_VERSION, "statements": {}}
+    for t, res in statements.items():
+        hits = [{"标准科目": k, "期间": PERIOD_NAMES[t][p], "value": v, "row": r + 1, "col": c + 1, "cell": cell_ref(r, c)}
+                for (k, p), (r, c, v) in res["hits"].items() if r != -1]
+        checks = [{"期间": chk["col"], "name": chk["name"], "terms": chk["terms"], "residual": round(chk["residual"], 2),
+                   "status": "失衡" if chk["failed"] else "通过", "cells": [cell_ref(r, c) for r, c in chk["cells"]]} for chk in res["checks"]]
+        out["statements"][t] = {"source": res["source"], "columns": res["active_cols"], "items": res["df_clean"].to_dict('records'),
+                                "hits": hits, "checks": checks, "derived": res["derived"], "errors": res["err_msg"]}
+    if prof is not None: out["profile"] = prof.as_dict()
+    return out
+
+def worker_loop(conn, cache_items, cache_dir, layout_dir, locate_pages):
+    # 常驻子进程：启动时把重依赖和别名自动机都准备好，请求到来只剩真正的解析与取数
+    from fred_core import ResultCache, run_statements, profiling
+    import pdfplumber, openpyxl  # noqa: F401  预热导入
+    cache = ResultCache(cache_items, cache_dir)
+    layouts = ResultCache(256, layout_dir) if layout_dir else None
+    conn.send(("ready", None))
+    while True:
+        task = conn.recv()
+        if task is None: break
+        name, data, types, profile = task
+        up = io.BytesIO(data)
+        up.name = name
+        try:
+            with profiling() as prof:
+                statements = run_statements(up, types, cache, 1, locate_pages, layouts)
+            conn.send(("ok", result_json(name, statements, prof if profile else None)))
+        except Exception as e:
+            conn.send(("failed", {"error": f"{type(e).__name__}: {e}"}))
+
+class ExtractPool:
+    # 每个槽位一个常驻子进程 + 一个派发线程；请求进有界队列，满了由调用方回 503
+    def __init__(self, jobs, max_queue, timeout=None, cache_items=32, cache_dir=None, layout_dir=None, locate_pages=True):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.tasks = queue.Queue(max_queue)
+        self.timeout, self.busy, self.lock = timeout, 0, threading.Lock()
+        self.worker_args = (cache_items, cache_dir, layout_dir, locate_pages)
+        self.slots = [self.spawn() for _ in range(jobs)]
+        for i in range(jobs): threading.Thread(target=self.dispatch, args=(i,), daemon=True).start()
+
+    def spawn(self):
+        parent, child = self.ctx.Pipe()
+        proc = self.ctx.Process(target=worker_loop, args=(child,) + self.worker_args, daemon=True)
+        proc.start()
+        child.close()
+        parent.recv()  # 等 "ready"，保证服务对外可用时子进程已预热
+        return {"proc": proc, "conn": parent}
+
+    def respawn(self, i):
+        slot = self.slots[i]
+        if slot["proc"].is_alive(): slot["proc"].terminate()
+        slot["proc"].join()
+        slot["conn"].close()
+        self.slots[i] = self.spawn()
+
+    def dispatch(self, i):
+        while True:
+            job = self.tasks.get()
+            if job is None: break
+            with self.lock: self.busy += 1
+            conn, broken = self.slots[i]["conn"], False
+            try:
+                conn.send(job["task"])
+                if conn.poll(self.timeout):
+                    job["status"], job["body"] = conn.recv()
+                else:
+                    job["status"], job["body"], broken = "timeout", {"error": f"超过 {self.timeout} 秒未完成，已终止"}, True
+            except (EOFError, OSError):
+                job["status"], job["body"], broken = "crashed", {"error": f"子进程异常退出 (exitcode={self.slots[i]['proc'].exitcode})"}, True
+            finally:
+                with self.lock: self.busy -= 1
+                job["done"].set()
+            # 先回应请求再重启进程，超时的调用方不必再等新进程预热
+            if broken: self.respawn(i)
+
+    def full(self):
+        return self.tasks.full()
+
+    def submit(self, name, data, types, profile=False):
+        # 队列满时抛 queue.Full；否则阻塞到结果返回
+        job = {"task": (name, data, types, profile), "done": threading.Event(), "status": None, "body": None}
+        self.tasks.put_nowait(job)
+        job["done"].wait()
+        return job["status"], job["body"]
+
+    def health(self):
+        return {"workers": sum(s["proc"].is_alive() for s in self.slots), "busy": self.busy, "queued": self.tasks.qsize(), "capacity": self.tasks.maxsize}
+
+    def close(self):
+        for _ in self.slots: self.tasks.put(None)
+        for s in self.slots:
+            try: s["conn"].send(None)
+            except OSError: pass
+            s["proc"].join(timeout=5)
+            if s["proc"].is_alive(): s["proc"].terminate()
+
+def make_handler(pool, max_bytes):
+    from fred_core import STATEMENT_TYPES
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, code, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items(): self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if urlparse(self.path).path != "/health": return self.reply(404, {"error": "未知路径"})
+            self.reply(200, pool.health())
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/extract": return self.reply(404, {"error": "未知路径"})
+            qs = parse_qs(url.query)
+            name = (qs.get("name") or [self.headers.get("X-File-Name", "")])[0]
+            types = [t for t in (qs.get("types") or [",".join(STATEMENT_TYPES)])[0].split(",") if t]
+            length = int(self.headers.get("Content-Length") or 0)
+            # 先看请求头再决定要不要读请求体：拒绝的请求不占内存
+            self.close_connection = True
+            if not name.lower().endswith(SUPPORTED_EXTS): return self.reply(400, {"error": f"name 需带扩展名 {'/'.join(SUPPORTED_EXTS)}"})
+            if not types or any(t not in STATEMENT_TYPES for t in types): return self.reply(400, {"error": f"types 只能是 {','.join(STATEMENT_TYPES)}"})
+            if length <= 0: return self.reply(411, {"error": "请求体为空或缺少 Content-Length"})
+            if length > max_bytes: return self.reply(413, {"error": f"文件超过 {max_bytes // (1 << 20)} MB 上限"})
+            if pool.full(): return self.reply(503, {"error": "排队已满，请稍后重试", **pool.health()}, {"Retry-After": "5"})
+            data = self.rfile.read(length)
+            self.close_connection = False
+            t0 = time.perf_counter()
+            try:
+                status, body = pool.submit(os.path.basename(name), data, types, qs.get("profile", ["0"])[0] == "1")
+            except queue.Full:
+                return self.reply(503, {"error": "排队已满，请稍后重试", **pool.health()}, {"Retry-After": "5"})
+            body["elapsed"] = round(time.perf_counter() - t0, 3)
+            self.reply(STATUS_CODES[status], body)
+
+        def log_message(self, fmt, *args):
+            sys.stderr.write(f"[{self.log_date_time_string()}] {self.address_string()} {fmt % args}\n")
+
+    return Handler
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fred ETL 本地 HTTP 提取服务")
+    ap.add_argument("--host", default="127.0.0.1", help="监听地址 (默认仅本机)")
+    ap.add_argument("--port", type=int, default=8765, help="监听端口 (默认 8765)")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="常驻解析进程数 (默认 CPU 核数)")
+    ap.add_argument("--queue", type=int, default=16, help="最多排队的请求数，超出回 503 (默认 16)")
+    ap.add_argument("--timeout", type=float, default=300, help="单个文件的超时秒数，超时即终止并重启该进程 (默认 300，0 为不限)")
+    ap.add_argument("--max-mb", type=int, default=50, help="单个上传文件的大小上限 MB (默认 50)")
+    ap.add_argument("--cache-items", type=int, default=int(os.environ.get("FRED_CACHE_ITEMS", 32)), help="每个进程内存里缓存的文件数")
+    ap.add_argument("--cache-dir", default=os.environ.get("FRED_CACHE_DIR"), help="解析结果落盘缓存目录，各进程共享")
+    ap.add_argument("--layout-dir", default=None, help="版式库目录：记住每种报表模板的取数坐标，重复模板直接复用")
+    ap.add_argument("--all-pages", action="store_true", help="PDF 不做报表页定位，解析全部页")
+    args = ap.parse_args(argv)
+
+    pool = ExtractPool(max(1, args.jobs), max(1, args.queue), args.timeout or None, args.cache_items, args.cache_dir, args.layout_dir, not args.all_pages)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(pool, args.max_mb << 20))
+    server.daemon_threads = True
+    print(f"Fred ETL 提取服务已启动: http://{args.host}:{server.server_port}  (进程 {args.jobs}，排队上限 {args.queue})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+import re
+import uuid
+import datetime
+from fred_core import MAP_VERSION, PERIOD_NAMES, file_digest, file_name
+
+# ==========================================
+# 列式结果库：Parquet 数据集按 statement=报表类型 / period=报告期 分区，只追加新文件、从不改写
+# 读取: read_store(目录, statement="BS", period="2024-12")；同一文件多次写入时默认只保留最新一次
+# ==========================================
+UNKNOWN_PERIOD = "unknown"
+# 年份前后不能紧挨数字，月份不在 1–12 的不算；not_num 会把 "2024年12月31日" 当数字，金额格另用 AMOUNT_CELL 排除
+# 整格 "2024.12" (两位月份) 按年月看，不当金额
+AMOUNT_CELL = re.compile(r'[-+(]?[\d,]*\.?\d+\)?%?')
+DOT_PERIOD_CELL = re.compile(r'(?:19|20)\d{2}\.(?:0[1-9]|1[0-2])')
+PERIOD_PATTERNS = [
+    # 累计期间 "2024年1-12月" / "2024年1月-12月" / "2024年1月1日至2024年12月31日"：取截止月
+    (re.compile(r'(?<!\d)((?:19|20)\d{2})年(\d{1,2})月?(?:\d{1,2}日)?[\-－—~至到](?:(?:19|20)\d{2}年)?(\d{1,2})月'),
+     lambda m: f"{m.group(1)}-{int(m.group(3)):02d}" if 1 <= int(m.group(2)) <= int(m.group(3)) <= 12 else None),
+    (re.compile(r'(?<!\d)((?:19|20)\d{2})[年\-/.](\d{1,2})(?!\d)(?=月|[\-/.]\d|$)'), lambda m: f"{m.group(1)}-{int(m.group(2)):02d}" if 1 <= int(m.group(2)) <= 12 else None),
+    (re.compile(r'(?<!\d)((?:19|20)\d{2})年(?:度|(?!\d))'), lambda m: m.group(1)),
+]
+
+def arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset
+    except ImportError:
+        raise ImportError("缺少 `pyarrow` 库。\n终端输入: `pip install pyarrow`")
+    return pyarrow
+
+def store_schema(pa):
+    return pa.schema([
+        ("file_id", pa.string()), ("file_name", pa.string()), ("期间列", pa.string()), ("标准科目", pa.string()),
+        ("value", pa.float64()), ("source", pa.string()), ("source_row", pa.int32()), ("source_col", pa.int32()),
+        ("check_status", pa.string()), ("map_version", pa.string()), ("extracted_at", pa.timestamp("ms")),
+    ])
+
+def infer_report_period(sheet, max_rows=20):
+    # 报告期取表头区域第一处 "2024年12月31日" / "2024-12" / "2024年度" 之类的日期；整格是金额的跳过
+    txt, filled = sheet["txt"], sheet["filled"]
+    for r in range(min(max_rows, sheet["n_rows"])):
+        for c in range(sheet["n_cols"]):
+            if not filled[r][c] or (AMOUNT_CELL.fullmatch(txt[r][c]) and not DOT_PERIOD_CELL.fullmatch(txt[r][c])): continue
+            for rx, fmt in PERIOD_PATTERNS:
+                for m in rx.finditer(txt[r][c]):
+                    period = fmt(m)
+                    if period: return period
+    return UNKNOWN_PERIOD
+
+def store_records(file_id, name, table_type, result, extracted_at=None):
+    # 每个 (科目, 期间列) 一行；来源坐标为原始表中的 1 起行列号，推算值没有坐标
+    extracted_at = extracted_at or datetime.datetime.now().replace(microsecond=0)
+    p_ids = {col: p for p, col in PERIOD_NAMES[table_type].items()}
+    status = {}
+    for chk in result["checks"]:
+        if status.get(chk["col"]) != "失衡": status[chk["col"]] = "失衡" if chk["failed"] else "通过"
+    rows = []
+    for rec in result["df_clean"].to_dict('records'):
+        k = rec["标准科目"]
+        for col in result["active_cols"]:
+            r, c, v = result["hits"].get((k, p_ids[col]), (-1, -1, 0.0))
+            source = "提取" if r != -1 else ("推算" if k in result["derived"].get(col, []) else None)
+            rows.append({"file_id": file_id, "file_name": name, "期间列": col, "标准科目": k, "value": float(rec[col]),
+                         "source": source, "source_row": r + 1 if r != -1 else None, "source_col": c + 1 if r != -1 else None,
+                         "check_status": status.get(col), "map_version": MAP_VERSION, "extracted_at": extracted_at})
+    return rows
+
+def append_results(root, file, table_type, result, period=None):
+    # 一次写入一个新的 parquet 文件 (文件名带随机后缀)，多进程同时追加也不会互相覆盖
+    pa = arrow()
+    file_id = file_digest(file)
+    if not period: period = infer_report_period(result["sheet"]) if "sheet" in result else UNKNOWN_PERIOD
+    rows = store_records(file_id, os.path.basename(file_name(file)), table_type, result)
+    if not rows: return None
+    part_dir = os.path.join(root, f"statement={table_type}", f"period={period}")
+    os.makedirs(part_dir, exist_ok=True)
+    name = f"part-{file_id[:16]}-{uuid.uuid4().hex[:8]}.parquet"
+    path = os.path.join(part_dir, name)
+    # 临时文件以 "." 开头：pyarrow 扫描数据集时默认跳过，写到一半 (或子进程崩溃留下) 的文件不会让并发读取失败
+    tmp = os.path.join(part_dir, f".{name}.tmp")
+    pa.parquet.write_table(pa.Table.from_pylist(rows, schema=store_schema(pa)), tmp)
+    os.replace(tmp, path)
+    return path
+
+def read_store(root, statement=None, period=None, latest=True):
+    pa = arrow()
+    partitioning = pa.dataset.partitioning(pa.schema([("statement", pa.string()), ("period", pa.string())]), flavor="hive")
+    dataset = pa.dataset.dataset(root, format="parquet", partitioning=partitioning, schema=store_schema(pa).append(pa.field("statement", pa.string())).append(pa.field("period", pa.string())))
+    filt = None
+    for field, value in [("statement", statement), ("period", period)]:
+        if value is None: continue
+        cond = pa.dataset.field(field) == value
+        filt = cond if filt is None else filt & cond
+    df = dataset.to_table(filter=filt).to_pandas()
+    if latest and not df.empty:
+        # 同一文件同一报表重复写入时，只保留最近一次
+        newest = df.groupby(["file_id", "statement"])["extracted_at"].transform("max")
+        df = df[df["extracted_at"] == newest].reset_index(drop=True)
+    return df
@@ -1,488 +1,91 @@
 import streamlit as st
-import pandas as pd
-import re
-import io
-from st_aggrid import AgGrid, GridOptionsBuilder, JsCode, GridUpdateMode, DataReturnMode
+import os
+import json
+from fred_pdf import PDF_WORKERS
 
 st.set_page_config(page_title="Fred ETL V2.4 (精细算力与锚定版)", layout="wide")
 
-# ==========================================
-# 1. 核心数据字典
-# ==========================================
-BS_STANDARD_MAP = {
-    "货币资金": ["货币资金", "现金及现金等价物", "银行存款", "库存现金", "Cash and cash equivalents", "Cash at bank", "Cash and bank"],
-    "交易性金融资产": ["交易性金融资产", "以公允价值计量且其变动计入当期损益的金融资产", "Trading financial assets", "Financial assets at FVTPL", r"以公允价值计量.*当期损益.*资产"],
-    "衍生金融资产": ["衍生金融资产", "Derivative financial assets"],
-    "应收票据": ["应收票据", "Notes receivable", "Bills receivable"],
-    "应收账款": ["应收账款", "应收账款账面余额", "Accounts receivable", "A/R", "Trade receivables"],
-    "坏账准备": ["坏账准备", r"[-减:：\s]*坏账准备", "Provision for bad debts"],
-    "应收账款净额": ["应收账款净额", "应收账款账面价值", "Net accounts receivable"],
-    "应收款项融资": ["应收款项融资", "Receivables financing"],
-    "预付款项": ["预付款项", "预付账款", "Prepayments", "Advances to suppliers"],
-    "其他应收款": ["其他应收款", "Other receivables"],
-    "存货": ["存货", "存货余额", "Inventories", "Inventory", "Stock"],
-    "在途物资": ["在途物资", "Materials in transit"],
-    "原材料": ["原材料", "Raw materials"],
-    "在产品": ["在产品", "Work in progress", "WIP"],
-    "库存商品": ["库存商品", "完工产品", "产成品", "Finished goods"],
-    "周转材料": ["周转材料", "包装物及低值易耗品", "Turnover materials"],
-    "委托加工物资": ["委托加工物资", "Consigned processing materials"],
-    "发出商品": ["发出商品", "Goods shipped in transit"],
-    "存货跌价准备": ["存货跌价准备", r"[-减:：\s]*存货跌价准备", "Provision for decline in value of inventories"],
-    "存货净额": ["存货净额", "存货账面价值", "Net inventories"],
-    "合同资产": ["合同资产", "Contract assets"],
-    "持有待售资产": ["持有待售资产", "Assets classified as held for sale"],
-    "一年内到期的非流动资产": ["一年内到期的非流动资产", "Non-current assets due within one year"],
-    "其他流动资产": ["其他流动资产", "Other current assets"],
-    "流动资产合计": ["流动资产合计", "流动资产总计", r"流动资产.*[合总]", "Total current assets", "Current assets total"],
-    
-    "债权投资": ["债权投资", "Debt investment"],
-    "其他债权投资": ["其他债权投资", "Other debt investment"],
-    "长期应收款": ["长期应收款", "Long-term receivables"],
-    "长期股权投资": ["长期股权投资", "Long-term equity investment", "LTI"],
-    "长期股权投资减值准备": ["长期股权投资减值准备", r"[-减:：\s]*长期股权投资减值准备"],
-    "长期股权投资净额": ["长期股权投资净额", "长期股权投资账面价值"],
-    "其他权益工具投资": ["其他权益工具投资", "Other equity instrument investment"],
-    "其他非流动金融资产": ["其他非流动金融资产", "Other non-current financial assets"],
-    "投资性房地产": ["投资性房地产", "Investment properties"],
-    "固定资产": ["固定资产原值", "固定资产原价", "固定资产", "Property, plant and equipment", "Fixed assets", "PPE"],
-    "累计折旧": ["减:累计折旧", "减：累计折旧", "累计折旧", r"[-减:：\s]*累计折旧", "Less: Accumulated depreciation"],
-    "固定资产减值准备": ["减:固定资产减值准备", "减：固定资产减值准备", "固定资产减值准备", r"[-减:：\s]*固定资产减值准备", "Less: Impairment of fixed assets"],
-    "固定资产净额": ["固定资产净额", "固定资产净值", "固定资产账面价值", "Net fixed assets"],
-    "在建工程": ["在建工程", "Construction in progress", "CIP"],
-    "生产性生物资产": ["生产性生物资产", "Productive biological assets"],
-    "油气资产": ["油气资产", "Oil and gas assets"],
-    "使用权资产": ["使用权资产", "Right-of-use assets"],
-    "无形资产": ["无形资产", "无形资产原价", "Intangible assets"],
-    "累计摊销": ["累计摊销", r"[-减:：\s]*累计摊销", "Accumulated amortization"],
-    "无形资产减值准备": ["无形资产减值准备", r"[-减:：\s]*无形资产减值准备"],
-    "无形资产净额": ["无形资产净额", "无形资产账面价值", "Net intangible assets"],
-    "开发支出": ["开发支出", "Development expenditure"],
-    "商誉": ["商誉", "Goodwill"],
-    "长期待摊费用": ["长期待摊费用", "Long-term deferred expenses", "Long-term prepaid expenses"],
-    "递延所得税资产": ["递延所得税资产", "Deferred tax assets"],
-    "其他非流动资产": ["其他非流动资产", "Other non-current assets"],
-    "非流动资产合计": ["非流动资产合计", "非流动资产总计", r"非流动资产.*[合总]", "Total non-current assets"],
-    "资产总计": ["资产总计", "资产合计", "资产总额", "Total assets"],
-
-    "短期借款": ["短期借款", "Short-term borrowings", "Short-term loans"],
-    "交易性金融负债": ["交易性金融负债", "以公允价值计量且其变动计入当期损益的金融负债", "Trading financial liabilities", r"以公允价值计量.*当期损益.*负债"],
-    "衍生金融负债": ["衍生金融负债", "Derivative financial liabilities"],
-    "应付票据": ["应付票据", "Notes payable", "Bills payable"],
-    "应付账款": ["应付账款", "Accounts payable", "A/P", "Trade payables"],
-    "预收款项": ["预收款项", "预收账款", "Advances from customers"],
-    "合同负债": ["合同负债", "Contract liabilities"],
-    "应付职工薪酬": ["应付职工薪酬", "Employee benefits payable", "Salaries payable"],
-    "应交税费": ["应交税费", "Taxes payable", "Accrued taxes"],
-    "其他应付款": ["其他应付款", "Other payables"],
-    "持有待售负债": ["持有待售负债", "Liabilities held for sale"],
-    "一年内到期的非流动负债": ["一年内到期的非流动负债", "Non-current liabilities due within one year"],
-    "其他流动负债": ["其他流动负债", "Other current liabilities"],
-    "流动负债合计": ["流动负债合计", "流动负债总计", r"流动负债.*[合总]", "Total current liabilities"],
-    
-    "长期借款": ["长期借款", "Long-term borrowings", "Long-term loans"],
-    "应付债券": ["应付债券", "Bonds payable"],
-    "租赁负债": ["租赁负债", "Lease liabilities"],
-    "长期应付款": ["长期应付款", "Long-term payables"],
-    "预计负债": ["预计负债", "Provisions"],
-    "递延收益": ["递延收益", "Deferred income"],
-    "递延所得税负债": ["递延所得税负债", "Deferred tax liabilities"],
-    "其他非流动负债": ["其他非流动负债", "Other non-current liabilities"],
-    "非流动负债合计": ["非流动负债合计", "非流动负债总计", r"非流动负债.*[合总]", "Total non-current liabilities"],
-    "负债合计": ["负债合计", "负债总额", "负债总计", r"负债.*[合总]", "Total liabilities"],
-
-    "实收资本": ["实收资本", "股本", "Paid-in capital", "Share capital", r"实收资本.*股本"],
-    "其他权益工具": ["其他权益工具", "Other equity instruments"],
-    "优先股": ["优先股", "Preferred stock", "Preferred shares"],
-    "永续债": ["永续债", "Perpetual bond"],
-    "资本公积": ["资本公积", "Capital reserve"],
-    "减:库存股": ["减:库存股", "库存股", "Less: Treasury shares"],
-    "其他综合收益": ["其他综合收益", "Other comprehensive income", "OCI"],
-    "专项储备": ["专项储备", "Special reserve"],
-    "盈余公积": ["盈余公积", "Surplus reserve", "Statutory reserve"],
-    "一般风险准备": ["一般风险准备", "General risk reserve"],
-    "未分配利润": ["未分配利润", "Retained earnings", "Undistributed profit"],
-    "归属于母公司所有者权益合计": ["归属于母公司所有者权益合计", "Equity attributable to owners of the parent"],
-    "少数股东权益": ["少数股东权益", "Minority interests", "Non-controlling interests"],
-    
-    # 💡 优化 1：彻底打补丁，涵盖所有可能的全角半角及“与/和”连接词
-    "所有者权益合计": [
-        "所有者权益合计", "股东权益合计", "所有者权益总计", "股东权益总计",
-        "所有者权益（或股东权益）合计", "所有者权益(或股东权益)合计",
-        r"所有者权益.*或.*股东权益.*[合总]计", r"所有者权益.*或股东权益.*合计", 
-        r"所有者权益.*[合总]", r"股东权益.*[合总]", r"所有者权益.*或.*",
-        "Total equity", "Total shareholders' equity"
-    ],
-    "负债和所有者权益总计": [
-        "负债和所有者权益总计", "负债和所有者权益合计", "负债及股东权益总计", 
-        "负债和所有者权益（或股东权益）总计", "负债和所有者权益(或股东权益)总计",
-        "负债与所有者权益（或股东权益）合计", "负债与所有者权益(或股东权益)合计",
-        "负债及所有者权益（或股东权益）合计", "负债及所有者权益合计",
-        r"负债.*和.*所有者权益.*总计", r"负债.*所有者权益.*或.*股东权益.*[合总]计",
-        "Total liabilities and equity"
-    ]
-}
-
-PL_STANDARD_MAP = {
-    "营业收入": ["一、营业收入", "^营业收入$", "营业收入合计"], 
-    "主营业务收入": ["其中：主营业务收入", "其中:主营业务收入", "主营业务收入"], 
-    "其他业务收入": ["其中：其他业务收入", "其中:其他业务收入", "其他业务收入"],
-    
-    "营业成本": ["减：营业成本", "减:营业成本", "^营业成本$", "营业成本合计"], 
-    "主营业务成本": ["其中：主营业务成本", "其中:主营业务成本", "主营业务成本"], 
-    "其他业务成本": ["其中：其他业务成本", "其中:其他业务成本", "其他业务成本"],
-    
-    "税金及附加": ["税金及附加", "营业税金及附加"],
-    "消费税": ["其中：消费税", "其中:消费税", "消费税"], 
-    "营业税": ["其中：营业税", "其中:营业税", "营业税"], 
-    "城市维护建设税": ["其中：城市维护建设税", "其中:城市维护建设税", "城市维护建设税"], 
-    "资源税": ["其中：资源税", "其中:资源税", "资源税"], 
-    "教育费附加": ["其中：教育费附加", "其中:教育费附加", "教育费附加"], 
-    "城镇土地使用税": ["其中：城镇土地使用税", "其中:城镇土地使用税", "城镇土地使用税"],
-    "房产税": ["其中：房产税", "其中:房产税", "房产税"],
-    "车船税": ["其中：车船税", "其中:车船税", "车船税"],
-    "印花税": ["其中：印花税", "其中:印花税", "印花税"],
-    "销售费用": ["销售费用", "营业费用"],
-    "广告及宣传费": ["其中：广告费和业务宣传费", "其中:广告费和业务宣传费", "广告费和业务宣传费", "其中：广告费", "其中:广告费", "其中：业务宣传费", "其中:业务宣传费", "广告费", "业务宣传费", "广告及宣传费"],
-    "商品维修费": ["其中：商品维修费", "其中:商品维修费", "商品维修费"],
-    "运输费": ["其中：运输费", "其中:运输费", "运输费"],
-    "包装费": ["其中：包装费", "其中:包装费", "包装费"],
-    "管理费用": ["管理费用"],
-    "开办费": ["其中：开办费", "其中:开办费", "开办费"], 
-    "业务招待费": ["其中：业务招待费", "其中:业务招待费", "业务招待费"],
-    "办公费": ["其中：办公费", "其中:办公费", "办公费"],
-    "折旧及摊销": ["其中：折旧费", "其中：摊销费", "折旧及摊销", "折旧费"],
-    "研发费用": ["研发费用"],
-    "财务费用": ["财务费用"],
-    "利息费用": ["其中：利息费用", "其中:利息费用", "利息费用", "利息支出"], 
-    "利息收入": ["其中：利息收入", "其中:利息收入", "利息收入"], 
-    "汇兑净损失": ["其中：汇兑净损失", "其中:汇兑净损失", "汇兑净损失", "汇兑损益"], 
-    "手续费": ["其中：手续费", "其中:手续费", "手续费"],
-    "其他收益": ["加：其他收益", "加:其他收益", "其他收益"],
-    "投资收益": ["加：投资收益", "加:投资收益", "投资收益"],
-    "对联营企业和合营企业的投资收益": ["其中：对联营企业和合营企业的投资收益", "其中:对联营企业和合营企业的投资收益"], 
-    "公允价值变动收益": ["加：公允价值变动收益", "加:公允价值变动收益", "公允价值变动收益"],
-    "信用减值损失": ["减：信用减值损失", "信用减值损失"],
-    "资产减值损失": ["减：资产减值损失", "资产减值损失"],
-    "资产处置收益": ["加：资产处置收益", "资产处置收益"],
-    "营业利润": ["二、营业利润", "营业利润"],
-    "营业外收入": ["加：营业外收入", "加:营业外收入", "营业外收入"],
-    "非流动资产处置利得": ["其中：非流动资产处置利得", "其中:非流动资产处置利得"], 
-    "营业外支出": ["减：营业外支出", "减:营业外支出", "营业外支出"],
-    "非流动资产处置损失": ["其中：非流动资产处置损失", "其中:非流动资产处置损失"], 
-    "利润总额": ["三、利润总额", "利润总额"],
-    "所得税费用": ["减：所得税费用", "减:所得税费用", "所得税费用"],
-    "净利润": ["四、净利润", "净利润"],
-    "持续经营净利润": ["（一）持续经营净利润", "(一)持续经营净利润", "持续经营净利润"],
-    "终止经营净利润": ["（二）终止经营净利润", "(二)终止经营净利润", "终止经营净利润"],
-    "归属于母公司所有者的净利润": ["归属于母公司所有者的净利润", "归属于母公司股东的净利润"],
-    "少数股东损益": ["少数股东损益"],
-    "综合收益总额": ["五、综合收益总额", "综合收益总额"]
-}
-
-BS_COL_MAP = {
-    "P2": ["期末", "本期", "本年余额", "期末数", "期末余额", "本期数", "本期金额", "本年期末", "Ending", "Closing balance"], 
-    "P1": ["期初", "年初", "上年余额", "期初数", "期初余额", "年初数", "年初余额", "上年年末余额", "上期年末余额", "上年数", "上期数", "上年同期", "Opening", "Beginning balance"]
-}
-
-PL_COL_MAP = {
-    "P1": ["本期", "本月", "本月数", "本期数", "本期金额", "本月金额", "本期发生额"], 
-    "P2": ["累计", "本年累计", "本期累计", "本年累计数", "本期累计数", "本期累积数", "本年累积数", "上期金额", "上期发生额", "上期数"]
-}
+@st.cache_resource
+def get_result_cache():
+    # Streamlit 每次交互都会重跑脚本，缓存对象必须挂在 cache_resource 上才能跨重跑存活
+    return ResultCache(int(os.environ.get("FRED_CACHE_ITEMS", 32)), os.environ.get("FRED_CACHE_DIR"))
 
-# ==========================================
-# 2. V1.3.3 原味处理函数
-# ==========================================
-def clean_num(text):
-    if pd.isna(text): return 0.0
-    t = re.sub(r'[^0-9.\-()]', '', str(text))
-    if t.startswith('(') and t.endswith(')'): t = '-' + t[1:-1]
-    match = re.search(r'-?\d+\.\d{1,4}|-?\d{4,}', t)
-    if match:
-        try:
-            val = float(match.group())
-            if val != 0 and val.is_integer() and 1 <= abs(val) <= 400: return None
-            return round(val, 2)
-        except: return 0.0
-    return 0.0 if t in ['-', '0', ''] else None
-
-def load_file(file):
-    ext = file.name.split('.')[-1].lower()
-    if ext == 'xlsx':
-        xls = pd.read_excel(file, sheet_name=None, header=None, engine='openpyxl')
-        return max(xls.values(), key=len)
-    elif ext == 'xls':
-        try:
-            xls = pd.read_excel(file, sheet_name=None, header=None, engine='xlrd')
-            return max(xls.values(), key=len)
-        except ImportError:
-            raise ImportError("缺少 `xlrd` 库。\n终端输入: `pip install xlrd`\n或者把文件另存为 .xlsx")
-    elif ext == 'pdf':
-        import pdfplumber
-        with pdfplumber.open(file) as pdf:
-            return pd.concat([pd.DataFrame(t) for p in pdf.pages for t in p.extract_tables() if t])
-    return pd.read_csv(file, header=None)
-
-def grid_search(df, row_key, period_key, table_type="BS", pl_used_cells=None):
-    map_dict = BS_STANDARD_MAP if table_type == "BS" else PL_STANDARD_MAP
-    col_dict = BS_COL_MAP if table_type == "BS" else PL_COL_MAP
-    row_aliases = map_dict[row_key]
-    col_aliases = col_dict[period_key]
-    target_cols = []
-    
-    for r in range(min(20, len(df))):
-        for c in range(len(df.columns)):
-            cell_txt = str(df.iloc[r, c]).replace("\n", "").replace(" ", "").replace("　", "").lower()
-            if not cell_txt or cell_txt == 'nan': continue
-            if any((al in cell_txt) or (cell_txt in al and len(cell_txt) >= 2) for al in [a.lower() for a in col_aliases]):
-                if c not in target_cols: target_cols.append(c)
-
-    if not target_cols: return 0.0, -1, -1
-
-    for r in range(len(df)):
-        for c in range(len(df.columns)):
-            raw = str(df.iloc[r,c]).replace("\n","").replace(" ","").replace("　","").lower()
-            if not raw or raw == 'nan': continue
-            
-            is_match = any(
-                re.search(a.lower(), raw) if a.startswith(r'^') or '.*' in a else a.lower() in raw 
-                for a in row_aliases
-            )
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
 
-            if is_match:
-                if "流动" in raw and "流动" not in str(row_aliases): continue
-                if "非流动" in raw and "非" not in str(row_aliases): continue
-                
-                if table_type == "BS":
-                    exclude_flags = False
-                    for ex in ["其中", "减值", "准备", "跌价", "折旧", "摊销", "清理", "减:", "减：", "加:", "加：", "加项", "减项", "+"]:
-                        if ex in raw and ex not in str(row_aliases):
-                            exclude_flags = True
-                            break
-                    if exclude_flags: continue
-                    
-                    if (raw.startswith("-") or raw.startswith("减")) and not any(kw in str(row_aliases) for kw in ["折旧", "摊销", "准备", "坏账", "减:"]):
-                        continue
-                else:
-                    if "其中" in raw and "其中" not in str(row_aliases): continue
-                    if row_key == "营业税" and "附加" in raw: continue
-                    if row_key == "消费税" and "附加" in raw: continue
-                    
-                    if row_key == "营业收入" and any(x in raw for x in ["主营", "其他", "外"]): continue
-                    if row_key == "营业成本" and any(x in raw for x in ["主营", "其他", "外"]): continue
-                    if row_key == "主营业务收入" and "成本" in raw: continue
-                    if row_key == "主营业务成本" and "收入" in raw: continue
-                    if row_key == "其他业务收入" and "成本" in raw: continue
-                    if row_key == "其他业务成本" and "收入" in raw: continue
-                    
-                if row_key == "其他权益工具" and "投资" in raw: continue
-                
-                for row_offset in [0, 1]: 
-                    check_r = r + row_offset
-                    if check_r >= len(df): continue
-                    for tc in [tc for tc in target_cols if tc >= c]:
-                        for off in [0, 1]:  
-                            if tc + off < len(df.columns):
-                                if table_type == "PL" and pl_used_cells is not None and (check_r, tc+off) in pl_used_cells: continue
-                                v = clean_num(df.iloc[check_r, tc+off])
-                                if v is not None: return v, check_r, tc+off
-                    for bc in range(c + 1, len(df.columns)):
-                        if table_type == "PL" and pl_used_cells is not None and (check_r, bc) in pl_used_cells: continue
-                        v = clean_num(df.iloc[check_r, bc])
-                        if v is not None: return v, check_r, bc
-    return 0.0, -1, -1
+def job_panel(keys, t_type, n_finished):
+    # 片段内轮询：只重画进度区；有新文件完成时整页重跑一次，把它的结果展示出来
+    jobs = st.session_state["jobs"]
+    snaps = [snapshot(jobs[k]) for k in keys]
+    for snap in snaps:
+        frac, text = job_progress(snap)
+        st.progress(frac, text=f"{'✅' if snap['status'] == '完成' else '❌' if snap['status'] == '失败' else '⏳'} {snap['name']} · {text}")
+        if snap["status"] in RUNNING and snap["hits"].get(t_type):
+            partial = partial_frame(snap["hits"][t_type], t_type)
+            if not partial.empty: st.dataframe(partial, hide_index=True, height=min(300, 36 * (len(partial) + 1)))
+    if sum(s["status"] not in RUNNING for s in snaps) > n_finished: st.rerun()
 
 # ==========================================
-# 3. 业务逻辑计算 (V1.3.3 原汁原味)
+# 4. 主程序 & UI 渲染
 # ==========================================
-def calculate_net_and_totals_bs(df_clean, col_key, c1_name, c2_name):
-    if df_clean.empty: return
-    
-    def v(n):
-        res_val = df_clean.loc[df_clean['标准科目']==n, col_key]
-        return res_val.values[0] if not res_val.empty else 0.0
-        
-    def calc_net(gross_key, contra_keys, net_key):
-        gross_val = v(gross_key)
-        contra_val = sum([abs(v(k)) for k in contra_keys]) 
-        net_extracted = v(net_key)
-        
-        if net_extracted == 0 and gross_val != 0:
-            net_calc = round(gross_val - contra_val, 2)
-            if net_key in df_clean['标准科目'].values: 
-                df_clean.loc[df_clean['标准科目'] == net_key, col_key] = net_calc
-            else:
-                val1 = net_calc if col_key == c1_name else 0.0
-                val2 = net_calc if col_key == c2_name else 0.0
-                if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = [net_key, val1, val2]
-                else: df_clean.loc[len(df_clean)] = [net_key, net_calc]
+st.sidebar.title("🛠️ 配置面板")
+table_type = st.sidebar.radio("选择要查看的报表:", ("资产负债表 (BS)", "利润表 (PL)"), help="上传一次即同时提取两张报表，切换查看不会重新解析")
+pdf_workers = st.sidebar.number_input("PDF 并行解析进程数", min_value=1, max_value=64, value=min(PDF_WORKERS, 64), help="大于 1 时按页段分发到多进程抽取表格")
+locate_pages = st.sidebar.checkbox("PDF 仅解析报表页", value=True, help="先按页面文字定位资产负债表/利润表所在页，跳过附注等无关页；定位不到时回退为全部页")
 
-    calc_net("固定资产", ["累计折旧", "固定资产减值准备"], "固定资产净额")
-    calc_net("无形资产", ["累计摊销", "无形资产减值准备"], "无形资产净额")
-    calc_net("存货", ["存货跌价准备"], "存货净额")
-    calc_net("应收账款", ["坏账准备"], "应收账款净额")
-    calc_net("长期股权投资", ["长期股权投资减值准备"], "长期股权投资净额")
+st.title(f"🛡️ Fred ETL V2.4 - {table_type.split(' ')[0]}")
 
-    a_curr, a_non = v('流动资产合计'), v('非流动资产合计')
-    if v('资产总计') == 0 and (a_curr != 0 or a_non != 0):
-        a_total_calc = round(a_curr + a_non, 2)
-        if '资产总计' in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == '资产总计', col_key] = a_total_calc
-        else: 
-            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = ['资产总计', a_total_calc if col_key == c1_name else 0.0, a_total_calc if col_key == c2_name else 0.0]
-            else: df_clean.loc[len(df_clean)] = ['资产总计', a_total_calc]
+ups = st.file_uploader("上传财务报表文件 (可多选；资产负债表与利润表可在同一文件的不同工作表/页)", type=['xlsx', 'xls', 'pdf', 'csv'], accept_multiple_files=True)
 
-    l_curr, l_non = v('流动负债合计'), v('非流动负债合计')
-    if v('负债合计') == 0 and (l_curr != 0 or l_non != 0):
-        l_total_calc = round(l_curr + l_non, 2)
-        if '负债合计' in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == '负债合计', col_key] = l_total_calc
-        else: 
-            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = ['负债合计', l_total_calc if col_key == c1_name else 0.0, l_total_calc if col_key == c2_name else 0.0]
-            else: df_clean.loc[len(df_clean)] = ['负债合计', l_total_calc]
+# 冷启动：上传控件先画出来，再导入 pandas 与解析引擎；模块按进程只导入一次，别名自动机在导入时编译，之后的重跑直接复用
+from fred_core import PERIOD_NAMES, Profile, ResultCache, profiling, stage
+from fred_jobs import JobQueue, RUNNING, snapshot, job_progress, partial_frame
+t_type = "BS" if "BS" in table_type else "PL"
 
-    a_total, l_total, e_total = v('资产总计'), v('负债合计'), v('所有者权益合计')
-    
-    if a_total == 0 and l_total != 0 and e_total != 0:
-        a_total = round(l_total + e_total, 2)
-        if '资产总计' in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == '资产总计', col_key] = a_total
-        else: 
-            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = ['资产总计', a_total if col_key == c1_name else 0.0, a_total if col_key == c2_name else 0.0]
-            else: df_clean.loc[len(df_clean)] = ['资产总计', a_total]
-    
-    elif l_total == 0 and a_total != 0 and e_total != 0:
-        l_total = round(a_total - e_total, 2)
-        if '负债合计' in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == '负债合计', col_key] = l_total
-        else: 
-            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = ['负债合计', l_total if col_key == c1_name else 0.0, l_total if col_key == c2_name else 0.0]
-            else: df_clean.loc[len(df_clean)] = ['负债合计', l_total]
-    
-    elif e_total == 0 and a_total != 0 and l_total != 0:
-        e_total = round(a_total - l_total, 2)
-        if '所有者权益合计' in df_clean['标准科目'].values: df_clean.loc[df_clean['标准科目'] == '所有者权益合计', col_key] = e_total
-        else: 
-            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = ['所有者权益合计', e_total if col_key == c1_name else 0.0, e_total if col_key == c2_name else 0.0]
-            else: df_clean.loc[len(df_clean)] = ['所有者权益合计', e_total]
+# 每个上传文件提交为一个后台任务 (同一文件同一组参数只提交一次)，解析期间界面照常响应
+jobs = st.session_state.setdefault("jobs", {})
+keys = [(f.file_id, int(pdf_workers), locate_pages) for f in ups or []]
+for f, key in zip(ups or [], keys):
+    if key not in jobs: jobs[key] = get_job_queue().submit(f.name, f.getvalue(), get_result_cache(), int(pdf_workers), locate_pages)
+for key in [k for k in jobs if k not in keys]: jobs.pop(key)
 
-# ==========================================
-# 4. 主程序 & UI 渲染
-# ==========================================
-st.sidebar.title("🛠️ 配置面板")
-table_type = st.sidebar.radio("选择要解析的报表类型:", ("资产负债表 (BS)", "利润表 (PL)"))
+finished = [k for k in keys if jobs[k]["status"] not in RUNNING]
+if keys:
+    st.fragment(job_panel, run_every=1.0 if len(finished) < len(keys) else None)(keys, t_type, len(finished))
+    if not finished: st.info("⏳ 正在后台解析，已解出的科目会先显示在上方；完成后自动展示标准化清单与勾稽结果。")
 
-st.title(f"🛡️ Fred ETL V2.4 - {table_type.split(' ')[0]}")
+view = None
+if len(finished) > 1:
+    labels = {k: jobs[k]["name"] for k in finished}
+    view = st.selectbox("查看文件", finished, format_func=labels.get, key="view_job")
+elif finished:
+    view = finished[0]
 
-up = st.file_uploader(f"上传{table_type.split(' ')[0]}文件", type=['xlsx', 'xls', 'pdf', 'csv'])
-
-if up:
+if view:
+    # 表格组件与导出 (openpyxl) 只在展示结果时才需要
+    import pandas as pd
+    from st_aggrid import AgGrid, GridOptionsBuilder, JsCode, GridUpdateMode, DataReturnMode
+    from fred_export import export_bytes
+    job = jobs[view]
+    up = job["file"]
     try:
-        raw = load_file(up)
-        hits, res = {}, []
-        
-        is_bs = "BS" in table_type
-        current_map = BS_STANDARD_MAP if is_bs else PL_STANDARD_MAP
-        t_type = "BS" if is_bs else "PL"
-        
-        c1_name = "期初余额" if is_bs else "本期金额"
-        c2_name = "期末余额" if is_bs else "累计金额"
-        
-        pl_used_p1 = set() if not is_bs else None
-        pl_used_p2 = set() if not is_bs else None
-        
-        for k in current_map:
-            v_1, r1, col1 = grid_search(raw, k, "P1", t_type, pl_used_p1)
-            if not is_bs and r1 != -1: pl_used_p1.add((r1, col1))
-            
-            v_2, r2, col2 = grid_search(raw, k, "P2", t_type, pl_used_p2)
-            if not is_bs and r2 != -1: pl_used_p2.add((r2, col2))
-            
-            hits[(k, "P1")], hits[(k, "P2")] = (r1, col1, v_1), (r2, col2, v_2)
-            
-            if v_1 != 0 or v_2 != 0:
-                res.append({"标准科目": k, c1_name: v_1, c2_name: v_2})
-                
-        df_clean = pd.DataFrame(res)
-        if not df_clean.empty:
-            df_clean[c1_name] = pd.to_numeric(df_clean[c1_name], errors='coerce').fillna(0.0)
-            df_clean[c2_name] = pd.to_numeric(df_clean[c2_name], errors='coerce').fillna(0.0)
-        
-        active_cols = [c1_name, c2_name]
-        if not df_clean.empty:
-            if c2_name in df_clean.columns and (df_clean[c2_name] == 0).all():
-                df_clean = df_clean.drop(columns=[c2_name])
-                active_cols = [c1_name]
-                hits = {k: v for k, v in hits.items() if k[1] != "P2"}
-            elif c1_name in df_clean.columns and (df_clean[c1_name] == 0).all():
-                df_clean = df_clean.drop(columns=[c1_name])
-                active_cols = [c2_name]
-                hits = {k: v for k, v in hits.items() if k[1] != "P1"}
-        
-        err_msg, err_coords = [], []
+        if job["error"] is not None: raise job["error"]
+        is_bs = t_type == "BS"
         
-        if not df_clean.empty:
-            if is_bs:
-                # 资产负债表 维持纯粹的 V1.3.3
-                for col_key in active_cols:
-                    p_id = "P1" if col_key == c1_name else "P2"
-                    calculate_net_and_totals_bs(df_clean, col_key, c1_name, c2_name)
-                    
-                    val_a = df_clean.loc[df_clean['标准科目'] == '资产总计', col_key].values[0] if '资产总计' in df_clean['标准科目'].values else 0.0
-                    val_l = df_clean.loc[df_clean['标准科目'] == '负债合计', col_key].values[0] if '负债合计' in df_clean['标准科目'].values else 0.0
-                    val_e = df_clean.loc[df_clean['标准科目'] == '所有者权益合计', col_key].values[0] if '所有者权益合计' in df_clean['标准科目'].values else 0.0
-                    
-                    if abs(round(val_a - (val_l + val_e), 2)) > 0.01:
-                        err_msg.append(f"【{col_key}】资产负债表失衡")
-                        for n in ['资产总计', '负债合计', '所有者权益合计']:
-                            if (n, p_id) in hits and hits[(n, p_id)][0] != -1:
-                                err_coords.append((hits[(n, p_id)][0], hits[(n, p_id)][1]))
-            else:
-                for col_key in active_cols:
-                    p_id = "P1" if col_key == c1_name else "P2"
-                    
-                    def get_pl_v(k):
-                        match = df_clean.loc[df_clean['标准科目'] == k, col_key]
-                        return match.values[0] if not match.empty else 0.0
-                        
-                    def update_or_add_pl(k, val):
-                        if k in df_clean['标准科目'].values:
-                            df_clean.loc[df_clean['标准科目'] == k, col_key] = val
-                        else:
-                            val1 = val if col_key == c1_name else 0.0
-                            val2 = val if col_key == c2_name else 0.0
-                            if c2_name in df_clean.columns: df_clean.loc[len(df_clean)] = [k, val1, val2]
-                            else: df_clean.loc[len(df_clean)] = [k, val]
-                    
-                    # 💡 优化 2：利用子项反推父项，严格贯彻“主营+其他=营业”
-                    if get_pl_v("营业收入") == 0:
-                        sub_rev = get_pl_v("主营业务收入") + get_pl_v("其他业务收入")
-                        if sub_rev != 0: update_or_add_pl("营业收入", round(sub_rev, 2))
-                        
-                    if get_pl_v("营业成本") == 0:
-                        sub_cost = get_pl_v("主营业务成本") + get_pl_v("其他业务成本")
-                        if sub_cost != 0: update_or_add_pl("营业成本", round(sub_cost, 2))
-                        
-                    if get_pl_v("税金及附加") == 0:
-                        tax_subs = ["消费税", "营业税", "城市维护建设税", "资源税", "教育费附加", "城镇土地使用税", "房产税", "车船税", "印花税"]
-                        tax_sum = sum(get_pl_v(t) for t in tax_subs)
-                        if tax_sum != 0: update_or_add_pl("税金及附加", round(tax_sum, 2))
-                    
-                    tot_profit = get_pl_v("利润总额")
-                    tax_exp = get_pl_v("所得税费用")
-                    net_profit = get_pl_v("净利润")
-                    
-                    if tot_profit != 0 and net_profit != 0:
-                        diff = abs(round(tot_profit - tax_exp - net_profit, 2))
-                        if diff > 0.01:
-                            err_msg.append(f"【{col_key}】存在差异(利润总额-所得税与净利润不符)")
-                            for n in ['利润总额', '所得税费用', '净利润']:
-                                if (n, p_id) in hits and hits[(n, p_id)][0] != -1: 
-                                    err_coords.append((hits[(n, p_id)][0], hits[(n, p_id)][1]))
+        # 解析耗时在后台任务里记一次；界面渲染每次重跑单独计时，不往任务的 Profile 里累加
+        statements, job_prof, ui_prof = job["result"], job["prof"], Profile()
+        result = statements[t_type]
+        sources = [f"{name}取自「{statements[t]['source']}」" for t, name in [("BS", "资产负债表"), ("PL", "利润表")] if statements[t]["source"]]
+        if sources: st.caption("📄 " + " ｜ ".join(sources))
+        raw, hits, df_clean = result["raw"], result["hits"], result["df_clean"]
+        active_cols, err_msg, err_coords = result["active_cols"], result["err_msg"], result["err_coords"]
+        values = result["values"]
+        check_by_col = {c["col"]: c for c in result["checks"]}
 
-            order = list(current_map.keys())
-            df_clean['_sort'] = df_clean['标准科目'].apply(lambda x: order.index(x) if x in order else 999)
-            df_clean = df_clean.sort_values('_sort').drop('_sort', axis=1).reset_index(drop=True)
-
-        tab1, tab2 = st.tabs(["📋 标准化清单与勾稽", "👁️ 开发者透视"])
+        tab1, tab2, tab3 = st.tabs(["📋 标准化清单与勾稽", "👁️ 开发者透视", "⏱️ 性能诊断"])
         
-        with tab1:
+        with tab1, profiling(ui_prof), stage("界面渲染·清单与勾稽"):
             st.subheader(f"📑 {table_type.split(' ')[0]}结构化数据 (拖选计算 Sum, Avg)")
             if not df_clean.empty:
                 gb = GridOptionsBuilder.from_dataframe(df_clean)
@@ -538,10 +141,10 @@ if up:
                 st.subheader("⚖️ 勾稽关系核算台账 (资产总计 = 负债合计 + 所有者权益合计)")
                 if not df_clean.empty:
                     for col_key in active_cols:
-                        v_a = df_clean.loc[df_clean['标准科目'] == '资产总计', col_key].sum()
-                        v_l = df_clean.loc[df_clean['标准科目'] == '负债合计', col_key].sum()
-                        v_e = df_clean.loc[df_clean['标准科目'] == '所有者权益合计', col_key].sum()
-                        diff = round(v_a - (v_l + v_e), 2)
+                        v_a = values[col_key].get('资产总计', 0.0)
+                        v_l = values[col_key].get('负债合计', 0.0)
+                        v_e = values[col_key].get('所有者权益合计', 0.0)
+                        diff = check_by_col[col_key]["residual"]
                         
                         st.markdown(f"**【{col_key}】**")
                         col1, col2, col3, col4 = st.columns(4)
@@ -553,10 +156,10 @@ if up:
                 st.subheader("⚖️ 利润表核心校验与明细台账")
                 if not df_clean.empty:
                     for col_key in active_cols:
-                        v_tot = df_clean.loc[df_clean['标准科目'] == '利润总额', col_key].sum()
-                        v_tax = df_clean.loc[df_clean['标准科目'] == '所得税费用', col_key].sum()
-                        v_net = df_clean.loc[df_clean['标准科目'] == '净利润', col_key].sum()
-                        diff = round(v_tot - v_tax - v_net, 2)
+                        v_tot = values[col_key].get('利润总额', 0.0)
+                        v_tax = values[col_key].get('所得税费用', 0.0)
+                        v_net = values[col_key].get('净利润', 0.0)
+                        diff = check_by_col[col_key]["residual"]
                         
                         st.markdown(f"**【{col_key}大类校验】**")
                         col1, col2, col3, col4 = st.columns(4)
@@ -566,16 +169,7 @@ if up:
                         col4.metric("推算差额", f"{diff:,.2f}", delta="平齐" if abs(diff) <= 0.01 else "失衡", delta_color="off" if abs(diff) <= 0.01 else "inverse")
                         
                         st.markdown(f"**【{col_key}科目穿透】**")
-                        for main_item, sub_items in [
-                            ("营业收入", ["主营业务收入", "其他业务收入"]),
-                            ("营业成本", ["主营业务成本", "其他业务成本"]),
-                            ("税金及附加", ["消费税", "营业税", "城市维护建设税", "资源税", "教育费附加", "城镇土地使用税", "房产税", "车船税", "印花税"]),
-                            ("销售费用", ["广告及宣传费", "商品维修费", "运输费", "包装费"]),
-                            ("管理费用", ["开办费", "业务招待费", "办公费", "折旧及摊销"]),
-                            ("财务费用", ["利息费用", "利息收入", "汇兑净损失", "手续费"])
-                        ]:
-                            v_main = df_clean.loc[df_clean['标准科目'] == main_item, col_key].sum()
-                            v_subs = sum([df_clean.loc[df_clean['标准科目'] == sub, col_key].sum() for sub in sub_items])
+                        for main_item, v_main, v_subs in result["drills"][col_key]:
                             if v_main != 0 or v_subs != 0:
                                 st.caption(f"🔹 **{main_item}** 总计: **{v_main:,.2f}** ｜ 其中已识别明细汇总: **{v_subs:,.2f}**")
 
@@ -583,46 +177,68 @@ if up:
             if not err_msg and not df_clean.empty: st.success("✅ 精度勾稽对账全部通过")
             
             if not df_clean.empty:
-                out = io.BytesIO()
-                with pd.ExcelWriter(out) as w: df_clean.to_excel(w, index=False)
-                st.download_button("📥 下载标准化 XLSX", out.getvalue(), f"Standard_{t_type}_Report.xlsx")
+                # 传入函数而不是字节：只有点击下载时才生成工作簿，两张报表连同取数来源与勾稽残差一并导出
+                export_items = [(up.name, t, statements[t]) for t in statements if not statements[t]["df_clean"].empty]
+                st.download_button("📥 下载标准化 XLSX (含取数来源与勾稽残差)", lambda: export_bytes(export_items), f"Standard_{t_type}_Report.xlsx")
+                store_dir = os.environ.get("FRED_STORE_DIR")
+                if store_dir and st.button("💾 写入结果库", help=f"两张报表按报表类型/报告期追加到 {store_dir} 下的 Parquet 数据集"):
+                    from fred_store import append_results
+                    for name, t, res in export_items: append_results(store_dir, up, t, res)
+                    st.toast(f"已写入结果库 {store_dir}")
 
-        with tab2:
+        with tab2, profiling(ui_prof), stage("界面渲染·开发者透视"):
             st.subheader("👁️ 开发者透视")
-            raw_display = raw.copy()
-            raw_display.columns = raw_display.columns.astype(str)
-            raw_display = raw_display.astype(str).replace('nan', '')
+            # 窗口化：只把当前页的行转成字符串下发，整表不再复制；跳转列表来自命中与失衡坐标
+            hit_names = {(r, col): f"{k} · {PERIOD_NAMES[t_type][p]}" for (k, p), (r, col, v) in hits.items() if r != -1}
+            marks = {f"🎯 {name} (第 {r + 1} 行, 第 {col + 1} 列)": r for (r, col), name in sorted(hit_names.items())}
+            marks.update({f"⚠️ 失衡 {hit_names.get((r, col), '')} (第 {r + 1} 行, 第 {col + 1} 列)": r for (r, col) in err_coords if r != -1})
+
+            n_rows = len(raw)
+            c_size, c_page, c_jump = st.columns([1, 1, 3])
+            page_size = c_size.selectbox("每页行数", [100, 200, 500, 1000], index=1, key="raw_page_size")
+            n_pages = max(1, -(-n_rows // page_size))
+
+            def jump_to_mark():
+                sel = st.session_state.get("raw_jump")
+                if sel in marks: st.session_state["raw_page"] = marks[sel] // st.session_state["raw_page_size"] + 1
+
+            c_jump.selectbox("跳转到命中单元格", list(marks), index=None, key="raw_jump", on_change=jump_to_mark, placeholder="选择科目或失衡单元格…")
+            if st.session_state.get("raw_page", 1) > n_pages: st.session_state["raw_page"] = n_pages
+            page = c_page.number_input(f"页码 (共 {n_pages} 页)", min_value=1, max_value=n_pages, key="raw_page")
+            start = (page - 1) * page_size
+            window = raw.iloc[start:start + page_size]
+            st.caption(f"显示第 {start + 1}–{start + len(window)} 行，共 {n_rows} 行")
+
+            raw_display = window.astype(str).replace('nan', '')
+            raw_display.columns = [str(c) for c in range(raw.shape[1])]
+            raw_display.insert(0, "#", range(start, start + len(window)))
             
-            hit_cells = []
+            # 高亮表在 Python 端建成 行→列→类型 的字典 (只含当前窗口)，单元格样式函数按 "#" 绝对行号做两次键查找；失衡格覆盖同格的命中
+            hit_map = {}
             for (k, p), (r, col, v) in hits.items():
-                if r != -1: hit_cells.append({"row": r, "col": str(col), "type": "hit"})
+                if start <= r < start + len(window): hit_map.setdefault(str(r), {}).setdefault(str(col), "hit")
             for (r, col) in err_coords:
-                if r != -1: hit_cells.append({"row": r, "col": str(col), "type": "err"})
+                if start <= r < start + len(window): hit_map.setdefault(str(r), {})[str(col)] = "err"
                 
             raw_jscode = JsCode("""
-            function(params) {
-                var hitCells = %s;
-                var rowIndex = params.node.rowIndex;
-                var colId = params.colDef.field;
-                
-                for(var i=0; i<hitCells.length; i++) {
-                    if (hitCells[i].row === rowIndex && hitCells[i].col === colId) {
-                        if (hitCells[i].type === 'err') {
-                            return {'backgroundColor': '#f8d7da', 'border': '2px solid red'};
-                        } else {
-                            return {'backgroundColor': '#fff3cd', 'border': '1px solid orange'};
-                        }
-                    }
-                }
-                return null;
-            };
-            """ % str(hit_cells))
+            (function() {
+                var hitMap = %s;
+                var errStyle = {'backgroundColor': '#f8d7da', 'border': '2px solid red'};
+                var hitStyle = {'backgroundColor': '#fff3cd', 'border': '1px solid orange'};
+                return function(params) {
+                    var row = hitMap[params.data['#']];
+                    var type = row && row[params.colDef.field];
+                    if (!type) return null;
+                    return type === 'err' ? errStyle : hitStyle;
+                };
+            })()
+            """ % json.dumps(hit_map))
 
             raw_gb = GridOptionsBuilder.from_dataframe(raw_display)
             raw_gb.configure_grid_options(enableRangeSelection=True)
-            for col in raw_display.columns:
-                raw_gb.configure_column(col, cellStyle=raw_jscode)
-                
+            # 样式函数挂在默认列定义上，整张表只下发一份高亮表
+            raw_gb.configure_default_column(cellStyle=raw_jscode)
+            raw_gb.configure_column("#", pinned="left", width=70)
             AgGrid(
                 raw_display,
                 gridOptions=raw_gb.build(),
@@ -631,6 +247,18 @@ if up:
                 height=600,
                 fit_columns_on_grid_load=False
             )
+
+        with tab3:
+            st.caption("解析各阶段为后台任务的耗时，界面渲染为本次交互的耗时；命中缓存而跳过的阶段不会出现。")
+            diag = job_prof.as_dict()
+            diag["stages"].update(ui_prof.as_dict()["stages"])
+            st.dataframe(pd.DataFrame({"阶段": list(diag["stages"]), "耗时(ms)": [round(v * 1000, 1) for v in diag["stages"].values()]}), hide_index=True)
+            with st.expander("计数器", expanded=False):
+                st.dataframe(pd.DataFrame({"计数项": list(diag["counters"]), "次数": list(diag["counters"].values())}), hide_index=True)
+            with st.expander("逐科目热点 (标签格 / 取数格 / 正则)", expanded=False):
+                if diag["accounts"]: st.dataframe(pd.DataFrame(diag["accounts"]).fillna(0), hide_index=True)
+                else: st.info("本次提取结果来自缓存，没有逐科目计数。")
+            st.download_button("📥 下载诊断 JSON", json.dumps(diag, ensure_ascii=False, indent=2), "fred_diagnostics.json")
             
     except Exception as e:
         if isinstance(e, ImportError) and "xlrd" in str(e):